@@ -19,6 +19,7 @@ min_A = 0
 import sys
 
 import numpy as np
+import numba
 from astropy.table import Table
 from scipy.optimize import curve_fit
 from scipy.ndimage import gaussian_filter
@@ -210,6 +211,38 @@ def get_spectra(spectra_name, redrock_name, lambda_width, index_to_fit,
     return target_id, redshift_redrock, flux, ivar_flux, model_flux, wavelength, index_with_fit
 
 
+@numba.jit(nopython=True, error_model='numpy', cache=True)
+def numba_gaussian_peak(x, A, sigma, B, C=0.0):
+    """
+    Gaussian peak centered on 0 on top of a linear continuum, A*exp(-x**2/(2*sigma**2)) + B + C*x.
+    Compiled with numba since it is evaluated many times per spectrum by curve_fit.
+    """
+    model = np.empty(x.size)
+    for i in range(x.size):
+        model[i] = A * np.exp(-1.0 * x[i]**2 / (2 * sigma**2)) + B + C * x[i]
+    return model
+
+
+@numba.jit(nopython=True, error_model='numpy', cache=True)
+def numba_gaussian_peak_jacobian(x, A, sigma, B, C=0.0, add_linear_term=False):
+    """
+    Analytic jacobian of numba_gaussian_peak with respect to (A, sigma, B) or (A, sigma, B, C)
+    if add_linear_term, so that curve_fit does not need finite differences.
+    """
+    if add_linear_term:
+        jac = np.empty((x.size, 4))
+    else:
+        jac = np.empty((x.size, 3))
+    for i in range(x.size):
+        gauss = np.exp(-1.0 * x[i]**2 / (2 * sigma**2))
+        jac[i, 0] = gauss
+        jac[i, 1] = A * gauss * x[i]**2 / sigma**3
+        jac[i, 2] = 1.0
+        if add_linear_term:
+            jac[i, 3] = x[i]
+    return jac
+
+
 def fit_mgii_line(target_id, redshift_redrock, flux, ivar_flux, model_flux, wavelength,
                   lambda_width, add_linear_term=False, gaussian_smoothing_fit=None, mask_mgii=None):
     """
@@ -266,9 +299,12 @@ def fit_mgii_line(target_id, redshift_redrock, flux, ivar_flux, model_flux, wave
 
         if add_linear_term:
             def fit_function(x, A, sigma, B, C):
-                return A * np.exp(-1.0 * (x)**2 / (2 * sigma**2)) + B + C * x
+                return numba_gaussian_peak(x, A, sigma, B, C)
+
+            def fit_jacobian(x, A, sigma, B, C):
+                return numba_gaussian_peak_jacobian(x, A, sigma, B, C, add_linear_term=True)
             try:
-                popt, pcov = curve_fit(fit_function,
+                popt, pcov = curve_fit(fit_function, jac=fit_jacobian,
                                        xdata=centered_wavelenght[mask_wave],
                                        ydata=flux_centered,
                                        sigma=sigma_flux_centered,
@@ -284,9 +320,12 @@ def fit_mgii_line(target_id, redshift_redrock, flux, ivar_flux, model_flux, wave
             fit_results[i][8] = np.diag(pcov)[3]
         else:
             def fit_function(x, A, sigma, B):
-                return A * np.exp(-1.0 * (x)**2 / (2 * sigma**2)) + B
+                return numba_gaussian_peak(x, A, sigma, B)
+
+            def fit_jacobian(x, A, sigma, B):
+                return numba_gaussian_peak_jacobian(x, A, sigma, B)
             try:
-                popt, pcov = curve_fit(fit_function,
+                popt, pcov = curve_fit(fit_function, jac=fit_jacobian,
                                        xdata=centered_wavelenght[mask_wave],
                                        ydata=flux_centered,
                                        sigma=sigma_flux_centered,
@@ -13,13 +13,6 @@ import fitsio
 import numpy as np
 import pandas as pd
 
-from desitarget.targets import main_cmx_or_sv
-from desitarget.targetmask import desi_mask
-from desitarget.sv3.sv3_targetmask import desi_mask as sv3_mask
-from desitarget.sv2.sv2_targetmask import desi_mask as sv2_mask
-from desitarget.sv1.sv1_targetmask import desi_mask as sv1_mask
-from desitarget.cmx.cmx_targetmask import cmx_mask
-
 from desiutil.log import get_logger
 
 from desispec.io.util import get_tempfilename
@@ -74,6 +67,41 @@ def parse(options=None):
     return args
 
 
+def _get_qso_mask_bit(DESI_TARGET):
+    """
+    Return the QSO targeting bit for the requested target selection.
+
+    The desitarget mask modules are imported here, only for the selection
+    actually used, to avoid paying for all of them at startup.
+
+    Args:
+        DESI_TARGET (str): name of DESI_TARGET for the wanted version of the target selection
+
+    Returns:
+        qso_mask_bit (int): QSO bit(s) to apply to the DESI_TARGET column,
+            or None if DESI_TARGET is not CMX / SV1 / SV2 / SV3 / MAIN
+    """
+    if DESI_TARGET == 'DESI_TARGET':
+        from desitarget.targetmask import desi_mask
+        qso_mask_bit = desi_mask.mask('QSO')
+    elif DESI_TARGET == 'SV3_DESI_TARGET':
+        from desitarget.sv3.sv3_targetmask import desi_mask as sv3_mask
+        qso_mask_bit = sv3_mask.mask('QSO')
+    elif DESI_TARGET == 'SV2_DESI_TARGET':
+        from desitarget.sv2.sv2_targetmask import desi_mask as sv2_mask
+        qso_mask_bit = sv2_mask.mask('QSO')
+    elif DESI_TARGET == 'SV1_DESI_TARGET':
+        from desitarget.sv1.sv1_targetmask import desi_mask as sv1_mask
+        qso_mask_bit = sv1_mask.mask('QSO')
+    elif DESI_TARGET == 'CMX_TARGET':
+        from desitarget.cmx.cmx_targetmask import cmx_mask
+        qso_mask_bit = cmx_mask.mask('MINI_SV_QSO|SV0_QSO')
+    else:
+        qso_mask_bit = None
+
+    return qso_mask_bit
+
+
 def select_targets_with_mgii_fitter(redrock, fibermap, sel_to_mgii, spectra_name, redrock_name, param_mgii_fitter, DESI_TARGET, save_target):
     """
     Run QuasarNet to the object with index_to_QN == True from spectra_name.
@@ -108,22 +136,22 @@ def select_targets_with_mgii_fitter(redrock, fibermap, sel_to_mgii, spectra_name
                                             min_A=param_mgii_fitter['min_A'],
                                             min_signifiance_A=param_mgii_fitter['min_signifiance_A'])
 
-        sel_MGII = sel_to_mgii.copy()
         # we only consider index where the mgii fit was done
-        sel_MGII[sel_to_mgii] = index_with_mgii_fit
-        # we then conserve only index where the mgii fit gives a good result !
-        sel_MGII[sel_MGII] = index_selected_with_mgii_fit
+        # and we then conserve only index where the mgii fit gives a good result !
+        index_fit = np.flatnonzero(index_with_mgii_fit)[index_selected_with_mgii_fit]
+        sel_MGII = np.zeros(sel_to_mgii.size, dtype=bool)
+        sel_MGII[np.flatnonzero(sel_to_mgii)[index_fit]] = True
 
         # Build dataframe to store the result
         QSO_sel = pd.DataFrame()
 
         if save_target == 'restricted':
-            index_to_save = sel_MGII.copy()
-            index_to_save_fit_result = index_with_mgii_fit.copy()
+            index_to_save = sel_MGII
             # keep only object selected by MGII
-            index_to_save_fit_result[index_with_mgii_fit] = index_selected_with_mgii_fit
+            index_to_save_fit_result = np.zeros(sel_to_mgii.sum(), dtype=bool)
+            index_to_save_fit_result[index_fit] = True
         elif save_target == 'all':
-            index_to_save = sel_to_mgii.copy()
+            index_to_save = sel_to_mgii
             # save every object with nan value if it is necessary --> there are sel_to_mgii.sum() objects to save
             # index_with_mgii_fit is size of sel_to_mgii.sum()
             index_to_save_fit_result = np.ones(sel_to_mgii.sum(), dtype=bool)
@@ -208,10 +236,8 @@ def save_dataframe_to_fits(dataframe, filename, DESI_TARGET, clobber=True):
 
     # Save file in temporary file to track when timeout error appears during the writing
     tmpfile = get_tempfilename(filename)
-    fits = fitsio.FITS(tmpfile, 'rw')
-    fits.write(data, extname='MGII')
+    fitsio.write(tmpfile, data, extname='MGII', clobber=True)
     log.info(f'write output in: {filename}')
-    fits.close()
 
     # Rename temporary file to output file, overwrite existing file.
     os.rename(tmpfile, filename)
@@ -254,28 +280,24 @@ def main(args=None):
                 return 1
 
             # Find which selection is used (SV1/ SV2 / SV3 / MAIN / ...)
+            from desitarget.targets import main_cmx_or_sv
             DESI_TARGET = main_cmx_or_sv(fibermap)[0][0]
 
-            if DESI_TARGET == 'DESI_TARGET':
-                qso_mask_bit = desi_mask.mask('QSO')
-            elif DESI_TARGET == 'SV3_DESI_TARGET':
-                qso_mask_bit = sv3_mask.mask('QSO')
-            elif DESI_TARGET == 'SV2_DESI_TARGET':
-                qso_mask_bit = sv2_mask.mask('QSO')
-            elif DESI_TARGET == 'SV1_DESI_TARGET':
-                qso_mask_bit = sv1_mask.mask('QSO')
-            elif DESI_TARGET == 'CMX_TARGET':
-                qso_mask_bit = cmx_mask.mask('MINI_SV_QSO|SV0_QSO')
-            else:
+            qso_mask_bit = _get_qso_mask_bit(DESI_TARGET)
+            if qso_mask_bit is None:
                 log.error("**** DESI_TARGET IS NOT CMX / SV1 / SV2 / SV3 / MAIN ****")
                 return 1
 
             is_qso_target = fibermap[DESI_TARGET] & qso_mask_bit != 0
-            sel_RR = (redrock['SPECTYPE'] == 'QSO')
 
             if args.target_selection == 'restricted':
                 # Run MgII fitter only on QSO targets with SPECTYPE!=QSO objects to save time !
-                sel_to_mgii = is_qso_target & ~sel_RR
+                if is_qso_target.any():
+                    sel_RR = (redrock['SPECTYPE'] == 'QSO')
+                    sel_to_mgii = is_qso_target & ~sel_RR
+                else:
+                    # no QSO targets (e.g. bright tile): nothing to run on
+                    sel_to_mgii = np.zeros_like(is_qso_target)
             elif args.target_selection.lower() in ('qso', 'qso_targets'):
                 # Run MgII fitter only on QSO targets
                 sel_to_mgii = is_qso_target
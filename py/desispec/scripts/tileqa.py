@@ -160,10 +160,15 @@ def main(args=None):
         nights=np.intersect1d(nights,requested_nights)
 
     log.info("nights = {}".format(nights))
-    if tileids is not None : log.info('tileids = {}'.format(tileids))
+    if tileids is not None :
+        log.info('tileids = {}'.format(tileids))
+        tileids_set = set(tileids)
+    else :
+        tileids_set = None
 
     summary_rows  = list()
     night_tileids=dict()  # dict[night] = list(tiles...)
+    qafitsfiles=dict()    # dict[(night,tileid)] = tile qa fits filename
     for count,night in enumerate(nights) :
         dirnames = sorted(glob.glob('{}/tiles/{}/*/{}'.format(args.prod, args.group, night)))
         night_tileids[night] = list()
@@ -173,8 +178,8 @@ def main(args=None):
                 night_tileids[night].append(tileid)
             except ValueError as e :
                 log.warning("ignore {}".format(dirname))
-        if tileids is not None :
-            night_tileids[night] = np.intersect1d(tileids,night_tileids[night])
+        if tileids_set is not None :
+            night_tileids[night] = sorted(set(night_tileids[night]) & tileids_set)
             if len(night_tileids[night]) == 0 :
                 log.warning(f'No tiles on night {night}; continuing')
                 continue
@@ -184,6 +189,7 @@ def main(args=None):
         func_args = []
         for tileid in night_tileids[night] :
             filename = findfile("tileqa",night=night,tile=tileid,specprod_dir=args.outdir, groupname=args.group)
+            qafitsfiles[(night,tileid)] = filename
             if not args.recompute :
                 if os.path.isfile(filename) :
                     log.info("skip existing {}".format(filename))
@@ -217,8 +223,7 @@ def main(args=None):
     # could be missing due to skipped fits file, or sky cutout server glitch
     for night, tileids in night_tileids.items():
         for tileid in tileids:
-            qafitsfile = findfile("tileqa", night=night, tile=tileid,
-                    specprod_dir=args.outdir, groupname=args.group)
+            qafitsfile = qafitsfiles[(night,tileid)]
             qapngfile = findfile("tileqapng", night=night, tile=tileid,
                     specprod_dir=args.outdir, groupname=args.group)
 
@@ -240,30 +245,36 @@ def main(args=None):
                 else :
                     colnames=keys
                     refrow=row
+        # default value for missing keys: zero or empty string of the reference type
+        col_defaults = {k : type(refrow[k])() for k in colnames}
         good_rows=[]
         for i,row in enumerate(summary_rows) :
-            keys=list(row.keys())
-            if len(keys)>0 :
-                if len(keys)<len(colnames) :
+            if len(row)>0 :
+                if len(row)<len(colnames) :
                     for k in colnames :
-                        if k in keys: continue
-                        row[k]=refrow[k]
-                        try :
-                            row[k]*=0
-                        except :
-                            row[k]=""
-                        log.warning("missing {} in {}".format(k,row["TILEID"]))
-                good_rows.append(row)
+                        if k not in row :
+                            log.warning("missing {} in {}".format(k,row["TILEID"]))
+                good_rows.append({k : row.get(k, col_defaults[k]) for k in colnames})
             else :
                 print("empty row",i)
-        table = Table(rows=good_rows, names=colnames)
+        # build the summary column by column so that numpy infers each dtype
+        # (including string lengths) once per column instead of once per cell
+        summary = dict()
+        for k in colnames :
+            column = np.array([row[k] for row in good_rows])
+            if column.dtype.kind == 'U' :
+                column = column.astype(np.bytes_)
+            summary[k] = column
+        data = np.zeros(len(good_rows), dtype=[(k, summary[k].dtype) for k in colnames])
+        for k in colnames :
+            data[k] = summary[k]
 
         print()
-        print(table)
+        print(Table(data, copy=False))
         print()
 
         tmpfile = get_tempfilename(args.outfile)
-        table.write(tmpfile, overwrite=True, format='fits')
+        fitsio.write(tmpfile, data, extname='TILE_SUMMARY', clobber=True)
         os.rename(tmpfile, args.outfile)
         log.info("wrote {}".format(args.outfile))
 
@@ -21,21 +21,45 @@ import multiprocessing as mp
 import numpy as np
 from numpy.lib.recfunctions import append_fields, drop_fields
 
-import fitsio
-from astropy.table import Table, hstack, vstack
-
 from desiutil.log import get_logger, DEBUG
-from desispec import io
-from desispec.zcatalog import find_primary_spectra
-from desispec.io.util import get_tempfilename, checkgzip, replace_prefix, write_bintable
-from desispec.io.table import read_table
-from desispec.coaddition import coadd_fibermap
-from desispec.specscore import compute_coadd_tsnr_scores
-from desispec.util import parse_keyval
-from desiutil.annotate import load_csv_units
-from desiutil.names import radec_to_desiname
 import desiutil.depend
 
+#- fitsio, astropy.table, and other desispec/desiutil modules are imported
+#- within the functions that use them so that parsing args (e.g. --help)
+#- doesn't pay their import time
+
+_sv1_target_files_cache = dict()
+def _get_sv1_target_files(targetdir):
+    """
+    Return dict of nside=8 healpix -> sorted list of sv1 target files
+
+    Args:
+        targetdir (str): dr9 target directory, i.e. $DESI_TARGET/catalogs/dr9
+
+    The directory tree is globbed once per targetdir and cached, rather than
+    once per healpix.
+    """
+    if targetdir in _sv1_target_files_cache:
+        return _sv1_target_files_cache[targetdir]
+
+    fileglob = f'{targetdir}/*/targets/sv1/resolve/*/sv1targets-*-hp-*.fits'
+    hpix_files = dict()
+    for filename in sorted(glob.glob(fileglob)):
+        #- sv1targets-{obscon}-hp-{hpix}.fits
+        hpix = os.path.splitext(os.path.basename(filename))[0].split('-hp-')[-1]
+        try:
+            hpix = int(hpix)
+        except ValueError:
+            continue
+
+        if hpix not in hpix_files:
+            hpix_files[hpix] = list()
+
+        hpix_files[hpix].append(filename)
+
+    _sv1_target_files_cache[targetdir] = hpix_files
+    return hpix_files
+
 def load_sv1_ivar_w12(hpix, targetids):
     """
     Load FLUX_IVAR_W1/W2 from sv1 target files for requested targetids
@@ -54,42 +78,279 @@ def load_sv1_ivar_w12(hpix, targetids):
     what was used for sv1 target selection and this is not trying to be a
     more generic targetid lookup function.
     """
+    import fitsio
+
     log = get_logger()
     #- the targets could come from any version of desitarget, so search all,
     #- but once a TARGETID is found it will be the same answer (for FLUX_IVAR*)
     #- as any other version because it is propagated from the same dr9 input
     #- Tractor files.
     targetdir = os.path.join(os.environ['DESI_TARGET'], 'catalogs', 'dr9')
-    fileglob = f'{targetdir}/*/targets/sv1/resolve/*/sv1targets-*-hp-{hpix}.fits'
-    sv1targetfiles = sorted(glob.glob(fileglob))
+    sv1targetfiles = _get_sv1_target_files(targetdir).get(int(hpix), list())
     nfiles = len(sv1targetfiles)
-    ntarg = len(np.unique(targetids))
+    unique_targetids = np.unique(targetids)
+    ntarg = len(unique_targetids)
     log.info(f'Searching {nfiles} sv1 target files for {ntarg} targets in nside=8 healpix={hpix}')
     columns = ['TARGETID', 'FLUX_IVAR_W1', 'FLUX_IVAR_W2']
     targets = list()
-    found_targetids = list()
+    #- found[i] tracks whether unique_targetids[i] has been found yet
+    found = np.zeros(ntarg, dtype=bool)
     for filename in sv1targetfiles:
         tx = fitsio.read(filename, 1, columns=columns)
-        keep = np.isin(tx['TARGETID'], targetids)
-        keep &= ~np.isin(tx['TARGETID'], found_targetids)
+        tids = tx['TARGETID']
+        ii = np.searchsorted(unique_targetids, tids)
+        keep = ii < ntarg
+        keep[keep] = unique_targetids[ii[keep]] == tids[keep]
+        keep[keep] = ~found[ii[keep]]
         targets.append(tx[keep])
-        found_targetids.extend(tx['TARGETID'][keep])
+        found[ii[keep]] = True
 
-        if np.all(np.isin(targetids, found_targetids)):
+        if np.all(found):
             break
 
     targets = np.hstack(targets)
 
-    missing = np.isin(targetids, targets['TARGETID'], invert=True)
+    missing = ~found[np.searchsorted(unique_targetids, targetids)]
     if np.any(missing):
         nmissing = np.sum(missing)
         log.error(f'{nmissing} TARGETIDs not found in sv1 healpix={hpix}')
 
     return targets
 
+def _wrap_load_sv1_ivar_w12(args):
+    """load_sv1_ivar_w12 wrapper to expand (hpix, targetids) args for multiprocessing"""
+    return load_sv1_ivar_w12(*args)
+
+def _get_pool(nproc):
+    """
+    Return a multiprocessing Pool with nproc processes
+
+    Uses fork when available so that workers inherit the already-imported
+    modules and cached state instead of re-importing them as with spawn
+    """
+    if 'fork' in mp.get_all_start_methods():
+        ctx = mp.get_context('fork')
+    else:
+        ctx = mp.get_context()
+
+    return ctx.Pool(nproc)
+
+_units_cache = dict()
+def _load_units(unitsfile):
+    """
+    Return (units, comments) dicts from desidatamodel column descriptions
+
+    Args:
+        unitsfile (str): path to column_descriptions.csv
+
+    Results are cached by (unitsfile, modification time) so that repeated
+    calls to main within the same process (e.g. zcatalog_wrap) only parse
+    the file once.  The returned dicts are shared and should not be modified.
+    """
+    from desiutil.annotate import load_csv_units
+
+    key = (unitsfile, os.path.getmtime(unitsfile))
+    if key not in _units_cache:
+        _units_cache[key] = load_csv_units(unitsfile)
+
+    return _units_cache[key]
+
+def _minimal_fibermap_columns(colnames):
+    """
+    Return the subset of FIBERMAP colnames propagated to minimal catalogs
+
+    Args:
+        colnames (list): FIBERMAP column names
+
+    Returns list of column names, not including TARGETID
+    """
+    # basic set of target information
+    fmcols = ['TARGET_RA', 'TARGET_DEC', 'FLUX_G', 'FLUX_R', 'FLUX_Z']
+
+    # add targeting columns
+    for colname in colnames:
+        if colname.endswith('_TARGET') and colname != 'FA_TARGET':
+            fmcols.append(colname)
+
+    # add columns needed for uniqueness that differ for healpix vs. tiles
+    extracols = ['TILEID', 'LASTNIGHT', 'HEALPIX', 'SURVEY', 'PROGRAM']
+    for colname in extracols:
+        if colname in colnames:
+            fmcols.append(colname)
+
+    return fmcols
+
+def _hstack_arrays(arrays, filename=None):
+    """
+    Combine the columns of row-matched structured arrays or Tables
+
+    Args:
+        arrays: list of structured ndarrays and/or Tables with the same rows;
+            TARGETID is only propagated from the first one
+
+    Options:
+        filename (str): input file the arrays came from, for error messages
+
+    Returns structured ndarray with the columns of every input, in order
+
+    Raises ValueError if a column other than TARGETID is in more than one input
+    """
+    columns = list()
+    colnames = set()
+    for i, arr in enumerate(arrays):
+        for name in arr.dtype.names:
+            if i > 0 and name == 'TARGETID':
+                continue
+            if name in colnames:
+                msg = f'Column {name} is in more than one HDU'
+                if filename is not None:
+                    msg += f' of {filename}'
+                raise ValueError(msg)
+            colnames.add(name)
+            columns.append((name, arr[name]))
+
+    #- allocate once then fill column by column, instead of hstacking Tables
+    dtype = [(name, col.dtype, col.shape[1:]) for name, col in columns]
+    data = np.empty(len(arrays[0]), dtype=dtype)
+    for name, col in columns:
+        data[name] = col
+
+    return data
+
+def _insert_columns(data, newcols):
+    """
+    Insert several columns into a table with a single copy
+
+    Args:
+        data: Table or structured ndarray
+        newcols: list of (index, name, value) to insert, in the order that
+            sequential Table.add_column(value, index=index, name=name)
+            calls would use; value is an array with one entry per row,
+            or a scalar that is broadcast to every row
+
+    Returns structured ndarray
+    """
+    columns = [(name, data[name]) for name in data.dtype.names]
+    for index, name, value in newcols:
+        columns.insert(index, (name, np.asarray(value)))
+
+    nrows = len(data)
+    dtype = list()
+    for name, col in columns:
+        if col.ndim == 0:
+            dtype.append((name, col.dtype))
+        else:
+            dtype.append((name, col.dtype, col.shape[1:]))
+
+    out = np.empty(nrows, dtype=dtype)
+    for name, col in columns:
+        out[name] = col
+
+    return out
+
+def _vstack_tables(tables):
+    """
+    Stack tables, avoiding astropy vstack when all have the same columns
+
+    Args:
+        tables: list of Tables and/or structured ndarrays
+
+    Returns stacked structured ndarray; falls back to astropy vstack (outer
+    join) if the inputs don't share the same column names, shapes, and dtype
+    kinds, in which case the result may be a masked array.
+    Input metadata is not propagated.
+
+    Note: to limit peak memory, entries of the input list are replaced by
+    None once copied into the output, unless falling back to vstack.
+    """
+    from astropy.table import Table, vstack
+
+    names = tables[0].dtype.names
+    if any(t.dtype.names != names for t in tables):
+        return vstack([Table(t, copy=False) for t in tables]).as_array()
+
+    dtype = list()
+    for name in names:
+        columns = [t[name] for t in tables]
+        shape = columns[0].shape[1:]
+        kind = columns[0].dtype.kind
+        if any(isinstance(c, np.ma.MaskedArray) or c.shape[1:] != shape or c.dtype.kind != kind
+               for c in columns):
+            return vstack([Table(t, copy=False) for t in tables]).as_array()
+
+        dtype.append((name, np.result_type(*[c.dtype for c in columns]), shape))
+
+    del columns
+
+    #- allocate the full catalog once and copy each input into its slice,
+    #- releasing the inputs as we go
+    data = np.empty(sum([len(t) for t in tables]), dtype=dtype)
+    start = 0
+    for i in range(len(tables)):
+        end = start + len(tables[i])
+        for name in names:
+            data[name][start:end] = tables[i][name]
+        tables[i] = None
+        start = end
+
+    return data
+
+def _get_firstnight(tileids, exp_fibermaps):
+    """
+    Return the first night each tile was observed
+
+    Args:
+        tileids: array of TILEID, e.g. one per zcat row
+        exp_fibermaps: list of exposure fibermaps with TILEID and NIGHT columns
+
+    Returns int32 array of the minimum exposure NIGHT for each entry of tileids
+
+    Raises ValueError if any of tileids has no exposures
+    """
+    #- min NIGHT per TILEID from the exposures sorted by TILEID, then
+    #- gather FIRSTNIGHT for every row by its position in that list
+    tileids = np.asarray(tileids)
+    exptileids = np.concatenate([e['TILEID'] for e in exp_fibermaps])
+    expnights = np.concatenate([e['NIGHT'] for e in exp_fibermaps])
+    order = np.argsort(exptileids, kind='stable')
+    exptileids = exptileids[order]
+    expnights = expnights[order]
+    if len(exptileids) > 0:
+        istart = np.flatnonzero(np.r_[True, exptileids[1:] != exptileids[:-1]])
+        uniqtileids = exptileids[istart]
+        firstnights = np.minimum.reduceat(expnights, istart).astype(np.int32)
+        ii = np.searchsorted(uniqtileids, tileids).clip(0, len(uniqtileids)-1)
+        firstnight = firstnights[ii]
+        bad = uniqtileids[ii] != tileids
+    else:
+        firstnight = np.zeros(len(tileids), dtype=np.int32)
+        bad = np.ones(len(tileids), dtype=bool)
+
+    #- every TILEID should have exposures
+    if np.any(bad):
+        badtiles = np.unique(tileids[bad])
+        raise ValueError(f'FIRSTNIGHT not set for tiles {badtiles}')
+
+    return firstnight
+
 def _wrap_read_redrock(optdict):
-    """read_redrock wrapper to expand dictionary of named args for multiprocessing"""
-    return read_redrock(**optdict)
+    """
+    read_redrock wrapper to expand dictionary of named args for multiprocessing
+
+    Returns (zcat, dependencies, expfibermap) with zcat and expfibermap as
+    structured ndarrays and dependencies as a dict of just the DEPNAMnn/DEPVERnn
+    keywords, so that the full headers aren't pickled back to the parent.
+    Returns (None, None, None) if the file was skipped.
+    """
+    results = _read_redrock(**optdict)
+    if results is None:
+        return None, None, None
+
+    data, meta, expfibermap = results
+    dependencies = dict()
+    desiutil.depend.mergedep(meta, dependencies)
+
+    return data, dependencies, expfibermap
 
 def read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pertile=False, counter=None):
     """
@@ -108,6 +369,36 @@ def read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pert
     Returns (zcat, expfibermap) where zcat is a join of the redrock REDSHIFTS
     catalog and the coadded FIBERMAP
     """
+    from astropy.table import Table
+
+    results = _read_redrock(rrfile, group=group, recoadd_fibermap=recoadd_fibermap,
+                            minimal=minimal, pertile=pertile, counter=counter)
+    if results is None:
+        return None
+
+    data, meta, expfibermap = results
+    data = Table(data, copy=False)
+    data.meta.update(meta)
+    expfibermap = Table(expfibermap, copy=False)
+
+    return data, expfibermap
+
+def _read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pertile=False, counter=None):
+    """
+    Read a Redrock file as structured arrays; see :func:`read_redrock` for args
+
+    Returns (zcat, meta, expfibermap) where zcat and expfibermap are
+    structured ndarrays and meta is a dict of header keywords propagated
+    from the inputs, or None if the file is skipped
+    """
+    import fitsio
+    from astropy.table import Table
+    from desispec.io.util import checkgzip, replace_prefix
+    from desispec.io.table import read_table
+    from desispec.coaddition import coadd_fibermap
+    from desispec.specscore import compute_coadd_tsnr_scores
+    from desiutil.names import radec_to_desiname
+
     log = get_logger()
     if counter is not None:
         i, n = counter
@@ -142,9 +433,20 @@ def read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pert
             fibermap, expfibermap = coadd_fibermap(fibermap_orig, onetile=pertile)
             if zbest_file:
                 fibermap.sort(['TARGETID'])
+            meta = dict(fibermap.meta)
+            fibermap = fibermap.as_array()
+            expfibermap = expfibermap.as_array()
+        elif minimal:
+            #- only read the FIBERMAP columns that will be propagated, and
+            #- the EXP_FIBERMAP columns needed for FIRSTNIGHT
+            fmcols = _minimal_fibermap_columns(fx['FIBERMAP'].get_colnames())
+            fibermap = fx['FIBERMAP'].read(columns=['TARGETID',]+fmcols)
+            expfibermap = fx['EXP_FIBERMAP'].read(columns=['TILEID', 'NIGHT'])
+            meta = dict()
         else:
-            fibermap = Table(fx['FIBERMAP'].read())
-            expfibermap = Table(fx['EXP_FIBERMAP'].read())
+            fibermap = fx['FIBERMAP'].read()
+            expfibermap = fx['EXP_FIBERMAP'].read()
+            meta = dict()
 
         assert np.all(redshifts['TARGETID'] == fibermap['TARGETID'])
 
@@ -162,6 +464,8 @@ def read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pert
                     scores['TARGETID'] = fibermap_orig['TARGETID']
                 tsnr2 = Table(compute_coadd_tsnr_scores(scores)[0])
                 tsnr2.sort(['TARGETID'])
+                meta.update(tsnr2.meta)
+                tsnr2 = tsnr2.as_array()
             else:
                 log.warning("Unable to obtain TSNR2 information for %s!", rrfile)
                 tsnr2 = None
@@ -179,70 +483,66 @@ def read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pert
                         colname = f'TSNR2_{targ}'
                     if colname not in tsnr2.dtype.names:  # This should work for both numpy arrays and Tables.
                         log.warning("TSNR2 table is missing %s, filling with dummy values.", colname)
-                        if isinstance(tsnr2, Table):
-                            tsnr2[colname] = np.zeros((len(tsnr2), ), dtype=np.float32)
-                        else:
-                            tsnr2 = append_fields(tsnr2, colname,
-                                                  np.zeros(tsnr2.shape, dtype=np.float32), dtypes=np.float32)
+                        tsnr2 = append_fields(tsnr2, colname,
+                                              np.zeros(tsnr2.shape, dtype=np.float32),
+                                              dtypes=np.float32, usemask=False)
 
     if minimal:
-        # basic set of target information
-        fmcols = ['TARGET_RA', 'TARGET_DEC', 'FLUX_G', 'FLUX_R', 'FLUX_Z']
-
-        # add targeting columns
-        for colname in fibermap.dtype.names:
-            if colname.endswith('_TARGET') and colname != 'FA_TARGET':
-                fmcols.append(colname)
-
-        # add columns needed for uniqueness that differ for healpix vs. tiles
-        extracols = ['TILEID', 'LASTNIGHT', 'HEALPIX', 'SURVEY', 'PROGRAM']
-        for colname in extracols:
-            if colname in fibermap.dtype.names:
-                fmcols.append(colname)
+        fmcols = _minimal_fibermap_columns(fibermap.dtype.names)
 
         # NIGHT header -> fibermap LASTNIGHT
         if ('LASTNIGHT' not in fmcols) and ('NIGHT' in hdr):
-            fibermap['LASTNIGHT'] = np.int32(hdr['NIGHT'])
+            fibermap = _insert_columns(fibermap,
+                    [(len(fibermap.dtype.names), 'LASTNIGHT', np.int32(hdr['NIGHT'])),])
             fmcols.append('LASTNIGHT')
 
-        data = hstack( [Table(redshifts), Table(fibermap[fmcols])] )
+        sources = [redshifts, fibermap[fmcols]]
 
     else:
-        fmcols = list(fibermap.dtype.names)
-        fmcols.remove('TARGETID')
         if tsnr2 is not None:
-            tsnr2cols = list(tsnr2.dtype.names)
-            tsnr2cols.remove('TARGETID')
-            data = hstack([
-                Table(redshifts),
-                Table(fibermap[fmcols]),
-                Table(tsnr2[tsnr2cols]),
-                ])
+            sources = [redshifts, fibermap, tsnr2]
         else:
-            data = hstack( [Table(redshifts), Table(fibermap[fmcols])] )
+            sources = [redshifts, fibermap]
+
+    data = _hstack_arrays(sources, filename=rrfile)
 
     #
     # These old columns show up in zbest files. They have been replaced with
     # COADD_NUMEXP, COADD_NUMTILE, which are obtained from coadd_fibermapp()
     # for zbest files.
     #
+    drop_cols = list()
     for drop_col in ('NUMEXP', 'NUMTILE', 'NUMTARGET', 'HPXPIXEL', 'BLOBDIST', 'FIBERFLUX_IVAR_G', 'FIBERFLUX_IVAR_R', 'FIBERFLUX_IVAR_Z'):
-        if drop_col in data.colnames:
+        if drop_col in data.dtype.names:
             log.info("Removing column '%s' from %s ('ZCATALOG').", drop_col, os.path.basename(rrfile))
-            data.remove_column(drop_col)
+            drop_cols.append(drop_col)
+
+    if drop_cols:
+        data = drop_fields(data, drop_cols, usemask=False)
 
     if data['RELEASE'].dtype == np.dtype('>i4'):
         log.info("Casting column 'RELEASE' in %s ('ZCATALOG') to 'int16'.", os.path.basename(rrfile))
-        data.replace_column('RELEASE', data['RELEASE'].astype(np.int16))
+        dtype = [(name, np.int16 if name == 'RELEASE' else data.dtype[name])
+                 for name in data.dtype.names]
+        data = data.astype(dtype)
+
+    #- Columns to add are collected as (index, name, value) in the order
+    #- Table.add_column would apply them, tracking the resulting colnames,
+    #- then inserted with a single copy at the end
+    colnames = list(data.dtype.names)
+    newcols = list()
+    def _add_column(value, index, name):
+        newcols.append((index, name, value))
+        colnames.insert(index, name)
 
     #
     # Older files, including, but not limited to zbest files, may not have DESINAME and other columns.
     #
     for add_col in ('DESINAME', 'MEAN_PSF_TO_FIBER_SPECFLUX', 'PLATE_RA', 'PLATE_DEC', 'FITMETHOD'):
-        if add_col not in data.colnames:
+        if add_col not in colnames:
             log.info("Adding missing column '%s' to %s ('ZCATALOG').", add_col, os.path.basename(rrfile))
             if add_col == 'DESINAME':
-                i = data.colnames.index('TARGET_DEC')
+                i = colnames.index('TARGET_DEC')
                 if (np.isfinite(data['TARGET_RA']) & np.isfinite(data['TARGET_DEC'])).all():
                     desiname = radec_to_desiname(data['TARGET_RA'], data['TARGET_DEC'])
                 else:
@@ -250,83 +550,82 @@ def read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pert
                     desiname = np.array(['-'*22]*len(data))
                     good_radec = np.where(np.isfinite(data['TARGET_RA']) & np.isfinite(data['TARGET_DEC']))[0]
                     desiname[good_radec] = radec_to_desiname(data['TARGET_RA'][good_radec], data['TARGET_DEC'][good_radec])
-                data.add_column(desiname,
-                                index=i, name=add_col)
+                _add_column(desiname,
+                            index=i, name=add_col)
             if add_col == 'MEAN_PSF_TO_FIBER_SPECFLUX':
                 log.warning("Adding missing column '%s' to %s ('ZCATALOG') with dummy values!", add_col, os.path.basename(rrfile))
-                i = data.colnames.index('MEAN_MJD')
-                data.add_column(np.zeros((len(data), ), dtype=np.float32),
-                                index=i, name=add_col)
+                i = colnames.index('MEAN_MJD')
+                _add_column(np.float32(0.0),
+                            index=i, name=add_col)
             if add_col == 'PLATE_RA':
                 try:
-                    i = data.colnames.index('SCND_TARGET')
+                    i = colnames.index('SCND_TARGET')
                 except ValueError:
-                    i = data.colnames.index('MWS_TARGET')
-                data.add_column(data['TARGET_RA'],
-                                index=i, name=add_col)
+                    i = colnames.index('MWS_TARGET')
+                _add_column(data['TARGET_RA'],
+                            index=i, name=add_col)
             if add_col == 'PLATE_DEC':
-                i = data.colnames.index('PLATE_RA')
-                data.add_column(data['TARGET_DEC'],
-                                index=i, name=add_col)
+                i = colnames.index('PLATE_RA')
+                _add_column(data['TARGET_DEC'],
+                            index=i, name=add_col)
             if add_col == 'FITMETHOD':
-                i = data.colnames.index('DESINAME')
-                data.add_column(np.array(['PCA'] * len(data)).astype(np.dtype('S4')),
-                                index=i, name=add_col)
-
-    for add_col in ('PSF_TO_FIBER_SPECFLUX', 'PLATE_RA', 'PLATE_DEC'):
-        if add_col not in expfibermap.colnames:
-            log.info("Adding missing column '%s' to %s ('EXP_FIBERMAP').", add_col, os.path.basename(rrfile))
-            if add_col == 'PSF_TO_FIBER_SPECFLUX':
-                log.warning("Adding missing column '%s' to %s ('EXP_FIBERMAP') with dummy values!", add_col, os.path.basename(rrfile))
-                i = expfibermap.colnames.index('FIBER_DEC')
-                expfibermap.add_column(np.zeros((len(expfibermap), ), dtype=np.float64),
-                                       index=i, name=add_col)
-            if add_col == 'PLATE_RA':
-                i = expfibermap.colnames.index('LAMBDA_REF')
-                expfibermap.add_column(expfibermap['FIBER_RA'],
-                                       index=i, name=add_col)
-            if add_col == 'PLATE_DEC':
-                i = expfibermap.colnames.index('PLATE_RA')
-                expfibermap.add_column(expfibermap['FIBER_DEC'],
-                                       index=i, name=add_col)
+                i = colnames.index('DESINAME')
+                _add_column(np.array('PCA', dtype='S4'),
+                            index=i, name=add_col)
+
+    #- minimal catalogs don't write EXP_FIBERMAP, so don't patch it either
+    if not minimal:
+        expcolnames = list(expfibermap.dtype.names)
+        expnewcols = list()
+        for add_col in ('PSF_TO_FIBER_SPECFLUX', 'PLATE_RA', 'PLATE_DEC'):
+            if add_col not in expcolnames:
+                log.info("Adding missing column '%s' to %s ('EXP_FIBERMAP').", add_col, os.path.basename(rrfile))
+                if add_col == 'PSF_TO_FIBER_SPECFLUX':
+                    log.warning("Adding missing column '%s' to %s ('EXP_FIBERMAP') with dummy values!", add_col, os.path.basename(rrfile))
+                    i = expcolnames.index('FIBER_DEC')
+                    value = np.float64(0.0)
+                if add_col == 'PLATE_RA':
+                    i = expcolnames.index('LAMBDA_REF')
+                    value = expfibermap['FIBER_RA']
+                if add_col == 'PLATE_DEC':
+                    i = expcolnames.index('PLATE_RA')
+                    value = expfibermap['FIBER_DEC']
+
+                expnewcols.append((i, add_col, value))
+                expcolnames.insert(i, add_col)
+
+        if expnewcols:
+            expfibermap = _insert_columns(expfibermap, expnewcols)
 
     #- Add group specific columns, recognizing some some of them may
     #- have already been inherited from the fibermap.
-    #- Put these columns right after TARGETID
-    nrows = len(data)
+    #- Put these columns right after TARGETID.
     icol = 1
     if group in ('perexp', 'pernight', 'cumulative'):
-        if 'TILEID' not in data.colnames:
-            data.add_column(np.full(nrows, hdr['TILEID'], dtype=np.int32),
-                    index=icol, name='TILEID')
+        if 'TILEID' not in colnames:
+            _add_column(np.int32(hdr['TILEID']), index=icol, name='TILEID')
             icol += 1
-        if 'PETAL_LOC' not in data.colnames:
-            data.add_column(np.full(nrows, hdr['PETAL'], dtype=np.int16),
-                    index=icol, name='PETAL_LOC')
+        if 'PETAL_LOC' not in colnames:
+            _add_column(np.int16(hdr['PETAL']), index=icol, name='PETAL_LOC')
             icol += 1
 
     if group == 'perexp':
-        data.add_column(np.full(nrows, hdr['NIGHT'], dtype=np.int32),
-                index=icol, name='NIGHT')
+        _add_column(np.int32(hdr['NIGHT']), index=icol, name='NIGHT')
         icol += 1
-        data.add_column(np.full(nrows, hdr['EXPID'], dtype=np.int32),
-                index=icol, name='EXPID')
+        _add_column(np.int32(hdr['EXPID']), index=icol, name='EXPID')
     elif group == 'pernight':
-        data.add_column(np.full(nrows, hdr['NIGHT'], dtype=np.int32),
-                index=icol, name='NIGHT')
+        _add_column(np.int32(hdr['NIGHT']), index=icol, name='NIGHT')
     elif group == 'cumulative':
-        if 'LASTNIGHT' not in data.colnames:
+        if 'LASTNIGHT' not in colnames:
             try:
                 lastnight = int(hdr['NIGHT'])
             except KeyError:
                 # Some daily reductions do not have this set, use the filename.
                 log.warning(f'NIGHT keyword missing from {rrfile}!')
                 lastnight = int(rrfile.split('-')[-1].split('.')[0].replace('thru', ''))
-            data.add_column(np.full(nrows, lastnight, dtype=np.int32),
-                    index=icol, name='LASTNIGHT')
+            _add_column(np.int32(lastnight), index=icol, name='LASTNIGHT')
     elif group == 'healpix':
-        data.add_column(np.full(nrows, hdr['HPXPIXEL'], dtype=np.int32),
-                index=icol, name='HEALPIX')
+        _add_column(np.int32(hdr['HPXPIXEL']), index=icol, name='HEALPIX')
 
     icol += 1
 
@@ -349,10 +648,11 @@ def read_redrock(rrfile, group=None, recoadd_fibermap=False, minimal=False, pert
         else:
             # This is temporary. The whole section above could do with some refactoring.
             raise NotImplementedError(f'No method to reconstruct SPGRPVAL!')
-    data.add_column(np.full(nrows, val, dtype=dtype),
-            index=icol, name='SPGRPVAL')
+    _add_column(np.asarray(val, dtype=dtype), index=icol, name='SPGRPVAL')
 
-    return data, expfibermap
+    data = _insert_columns(data, newcols)
+
+    return data, meta, expfibermap
 
 
 #--------------------------------------------------------------------------
@@ -401,6 +701,13 @@ def main(args=None):
     if not isinstance(args, argparse.Namespace):
         args = parse(options=args)
 
+    import fitsio
+    from astropy.table import Table
+    from desispec import io
+    from desispec.zcatalog import find_primary_spectra
+    from desispec.io.util import get_tempfilename, write_bintable
+    from desispec.util import parse_keyval
+
     if args.verbose:
         log=get_logger(DEBUG)
     else:
@@ -511,105 +818,132 @@ def main(args=None):
                               recoadd_fibermap=args.recoadd_fibermap, minimal=args.minimal,
                               counter=(ifile+1, nfiles)))
 
-    #- Read individual Redrock files
+    #- Read individual Redrock files; imap (not imap_unordered) streams the
+    #- results back while preserving the input file order
     if args.nproc>1:
-        from multiprocessing import Pool
-        with Pool(args.nproc) as pool:
-            results = pool.map(_wrap_read_redrock, read_args)
+        pool = _get_pool(args.nproc)
+        chunksize = max(1, nfiles // (4*args.nproc))
+        results = pool.imap(_wrap_read_redrock, read_args, chunksize=chunksize)
     else:
-        results = [_wrap_read_redrock(a) for a in read_args]
+        pool = None
+        results = map(_wrap_read_redrock, read_args)
 
-    #- Stack catalogs
+    #- Collect catalogs as they arrive; terminate the pool even if
+    #- collecting fails so that workers aren't left behind
     zcatdata = list()
     exp_fibermaps = list()
     dependencies = dict()
-    for data, expfibermap in results:
-        if data is not None:
-            desiutil.depend.mergedep(data.meta, dependencies)
-            desiutil.depend.remove_dependencies(data.meta)
-            zcatdata.append(data)
-
-        if expfibermap is not None:
-            exp_fibermaps.append(expfibermap)
+    try:
+        for data, depend, expfibermap in results:
+            if data is not None:
+                desiutil.depend.mergedep(depend, dependencies)
+                zcatdata.append(data)
+
+            if expfibermap is not None:
+                exp_fibermaps.append(expfibermap)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    #- only keep references in zcatdata and exp_fibermaps so that they
+    #- can be released while stacking
+    del data, depend, expfibermap
 
     log.info('Stacking zcat')
-    zcat = vstack(zcatdata)
-    desiutil.depend.mergedep(dependencies, zcat.meta)
-    if exp_fibermaps:
-        log.info('Stacking exposure fibermaps')
-        assert all([isinstance(e, Table) for e in exp_fibermaps])
-        try:
-            expfm = vstack(exp_fibermaps)
-        except Exception as e:
-            log.error(f'Unexpected exception when stacking exposure fibermaps!')
-            log.error(type(e))
-            log.error(e.args[0])
-            expfm = None
-    else:
-        expfm = None
+    zcat = _vstack_tables(zcatdata)
+    if isinstance(zcat, np.ma.MaskedArray):
+        zcat = zcat.data
+
+    #- zcat stays a structured ndarray; new columns are collected as
+    #- (index, name, value) and inserted with a single copy at the end
+    newcols = list()
 
     #- Add FIRSTNIGHT for tile-based cumulative catalogs
     #- (LASTNIGHT was added while reading from NIGHT header keyword)
-    if args.group == 'cumulative' and expfm is not None and 'FIRSTNIGHT' not in zcat.colnames:
+    #- This only needs TILEID and NIGHT from the exposure fibermaps; the full
+    #- EXP_FIBERMAP is stacked after zcat has been written and released
+    if args.group == 'cumulative' and exp_fibermaps and 'FIRSTNIGHT' not in zcat.dtype.names:
         log.info('Adding FIRSTNIGHT per tile')
-        icol = zcat.colnames.index('LASTNIGHT')
-        zcat.add_column(np.zeros(len(zcat), dtype=np.int32),
-                    index=icol, name='FIRSTNIGHT')
-        for tilefm in Table(expfm[['TILEID', 'NIGHT']]).group_by('TILEID').groups:
-            tileid = tilefm['TILEID'][0]
-            iitile = zcat['TILEID'] == tileid
-            zcat['FIRSTNIGHT'][iitile] = np.min(tilefm['NIGHT'])
-
-        #- all FIRSTNIGHT entries should be filled (no more zeros)
-        bad = zcat['FIRSTNIGHT'] == 0
-        if np.any(bad):
-            badtiles = np.unique(zcat['TILEID'][bad])
-            raise ValueError(f'FIRSTNIGHT not set for tiles {badtiles}')
+        icol = zcat.dtype.names.index('LASTNIGHT')
+        firstnight = _get_firstnight(zcat['TILEID'], exp_fibermaps)
+        newcols.append((icol, 'FIRSTNIGHT', firstnight))
 
     #- if TARGETIDs appear more than once, which one is best within this catalog?
-    if 'TSNR2_LRG' in zcat.colnames and 'ZWARN' in zcat.colnames:
+    if 'TSNR2_LRG' in zcat.dtype.names and 'ZWARN' in zcat.dtype.names:
         log.info('Finding best spectrum for each target')
         nspec, primary = find_primary_spectra(zcat)
-        zcat['ZCAT_NSPEC'] = nspec.astype(np.int16)
-        zcat['ZCAT_PRIMARY'] = primary
+        icol = len(zcat.dtype.names) + len(newcols)
+        newcols.append((icol, 'ZCAT_NSPEC', nspec.astype(np.int16)))
+        newcols.append((icol+1, 'ZCAT_PRIMARY', primary))
     else:
         log.info('Missing TSNR2_LRG or ZWARN; not adding ZCAT_PRIMARY/_NSPEC')
 
     #- Used for fuji, should not be needed for later prods
     if args.patch_missing_ivar_w12:
         from desimodel.footprint import radec2pix
-        missing = (zcat['FLUX_IVAR_W1'] < 0) | (zcat['FLUX_IVAR_W2'] < 0)
-        missing &= zcat['OBJTYPE'] == 'TGT'
-        missing &= zcat['TARGETID'] > 0
+        #- build the mask in place with a single catalog-sized temporary,
+        #- then only check OBJTYPE and TARGETID for the (few) candidate rows
+        missing = np.less(zcat['FLUX_IVAR_W1'], 0)
+        tmp = np.empty_like(missing)
+        missing |= np.less(zcat['FLUX_IVAR_W2'], 0, out=tmp)
+        del tmp
+        ii = np.flatnonzero(missing)
+        missing[ii] = (zcat['OBJTYPE'][ii].astype(str) == 'TGT') & (zcat['TARGETID'][ii] > 0)
 
         if not np.any(missing):
             log.info('No targets missing FLUX_IVAR_W1/W2 to patch')
         else:
-            #- Load targets from sv1 targeting files
-            ra = zcat['TARGET_RA']
-            dec = zcat['TARGET_DEC']
+            #- Group missing rows by healpix
+            rows_missing = np.flatnonzero(missing)
+            ra = zcat['TARGET_RA'][rows_missing]
+            dec = zcat['TARGET_DEC'][rows_missing]
             nside = 8  #- use for sv1 targeting
             hpix8 = radec2pix(nside, ra, dec)
-            for hpix in np.unique(hpix8[missing]):
-                hpixmiss = (hpix == hpix8) & missing
-                targets = load_sv1_ivar_w12(hpix, zcat['TARGETID'][hpixmiss])
-
-                #- create dict[TARGETID] -> row number
-                targetid2idx = dict(zip(targets['TARGETID'],
-                                        np.arange(len(targets))))
-
-                #- patch missing values, if they are in the targets file
-                for i in np.where(hpixmiss)[0]:
-                    tid = zcat['TARGETID'][i]
-                    try:
-                        j = targetid2idx[ tid ]
-                        zcat['FLUX_IVAR_W1'][i] = targets['FLUX_IVAR_W1'][j]
-                        zcat['FLUX_IVAR_W2'][i] = targets['FLUX_IVAR_W2'][j]
-                    except KeyError:
+            order = np.argsort(hpix8, kind='stable')
+            hpixlist, istart = np.unique(hpix8[order], return_index=True)
+            hpixrows = np.split(rows_missing[order], istart[1:])
+            load_args = [(hpix, zcat['TARGETID'][rows]) for hpix, rows in zip(hpixlist, hpixrows)]
+
+            #- Load targets from sv1 targeting files, in parallel across healpix;
+            #- the parent process patches zcat as results arrive
+            if args.nproc>1 and len(load_args)>1:
+                #- glob the sv1 target files once before forking
+                _get_sv1_target_files(os.path.join(os.environ['DESI_TARGET'], 'catalogs', 'dr9'))
+                pool = _get_pool(min(args.nproc, len(load_args)))
+                results = pool.imap(_wrap_load_sv1_ivar_w12, load_args)
+            else:
+                pool = None
+                results = map(_wrap_load_sv1_ivar_w12, load_args)
+
+            try:
+                for rows, targets in zip(hpixrows, results):
+                    #- match rows to targets via the sorted target TARGETIDs
+                    tids = zcat['TARGETID'][rows]
+                    order = np.argsort(targets['TARGETID'])
+                    sorted_tids = targets['TARGETID'][order]
+                    if len(sorted_tids) > 0:
+                        ii = np.searchsorted(sorted_tids, tids).clip(0, len(sorted_tids)-1)
+                        found = sorted_tids[ii] == tids
+                    else:
+                        ii = np.zeros(len(tids), dtype=int)
+                        found = np.zeros(len(tids), dtype=bool)
+
+                    #- patch missing values, if they are in the targets file
+                    j = order[ii[found]]
+                    zcat['FLUX_IVAR_W1'][rows[found]] = targets['FLUX_IVAR_W1'][j]
+                    zcat['FLUX_IVAR_W2'][rows[found]] = targets['FLUX_IVAR_W2'][j]
+                    for i, tid in zip(rows[~found], tids[~found]):
                         log.warning(f'TARGETID {tid} (row {i}) not found in sv1 targets')
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
 
-    #- we're done adding columns, convert to numpy array for fitsio
-    zcat = np.array(zcat)
+    #- we're done patching; add the new columns
+    if newcols:
+        zcat = _insert_columns(zcat, newcols)
+        del newcols
 
     #- Inherit header from first input, but remove keywords that don't apply
     #- across multiple files
@@ -646,7 +980,7 @@ def main(args=None):
         datamodeldir = str(importlib.resources.files('desidatamodel'))
         unitsfile = os.path.join(datamodeldir, 'data', 'column_descriptions.csv')
         log.info(f'Adding units from {unitsfile}')
-        units, comments = load_csv_units(unitsfile)
+        units, comments = _load_units(unitsfile)
     else:
         units = dict()
         comments = dict()
@@ -654,11 +988,25 @@ def main(args=None):
     log.info(f'Writing {args.outfile}')
     tmpfile = get_tempfilename(args.outfile)
 
-    write_bintable(tmpfile, zcat, header=header, extname='ZCATALOG',
+    #- DEPNAMnn/DEPVERnn merged from the inputs go in via the table meta,
+    #- so that same-named keywords from the first input's header still win
+    write_bintable(tmpfile, Table(zcat, meta=dependencies, copy=False),
+                   header=header, extname='ZCATALOG',
                    units=units, comments=comments, clobber=True)
+    del zcat
+
+    if not args.minimal and exp_fibermaps:
+        log.info('Stacking exposure fibermaps')
+        try:
+            expfm = _vstack_tables(exp_fibermaps)
+        except Exception as e:
+            log.error(f'Unexpected exception when stacking exposure fibermaps!')
+            log.error(type(e))
+            log.error(e.args[0])
+            expfm = None
 
-    if not args.minimal and expfm is not None:
-        write_bintable(tmpfile, expfm, extname='EXP_FIBERMAP', units=units, comments=comments)
+        if expfm is not None:
+            write_bintable(tmpfile, expfm, extname='EXP_FIBERMAP', units=units, comments=comments)
 
     os.rename(tmpfile, args.outfile)
 
@@ -0,0 +1,76 @@
+"""
+Test desispec.mgii_afterburner
+"""
+
+import unittest
+
+import numpy as np
+from scipy.optimize import curve_fit
+
+from desispec.mgii_afterburner import (numba_gaussian_peak, numba_gaussian_peak_jacobian,
+                                       fit_mgii_line, create_mask_fit)
+
+class TestMgIIAfterburner(unittest.TestCase):
+
+    def setUp(self):
+        #- fixed-seed spectra: half with a MgII line on a flat continuum, half noise only
+        rng = np.random.default_rng(42)
+        self.lambda_width = 250
+        self.wavelength = np.arange(3600., 9800., 0.8)
+        nspec = 10
+        self.target_id = np.arange(nspec)
+        self.redshift = np.linspace(0.8, 1.6, nspec)
+        self.has_line = np.arange(nspec) % 2 == 0
+
+        mean_mgii_peak = (2803.5324 + 2796.3511) / 2
+        continuum = 2.0
+        self.model_flux = np.full((nspec, self.wavelength.size), continuum)
+        self.ivar_flux = np.full((nspec, self.wavelength.size), 4.0)
+        self.flux = self.model_flux + rng.normal(scale=0.5, size=self.model_flux.shape)
+        for i in np.flatnonzero(self.has_line):
+            x = self.wavelength - (1 + self.redshift[i]) * mean_mgii_peak
+            self.flux[i] += 3.0 * np.exp(-x**2 / (2 * 30.**2))
+
+    def test_gaussian_peak(self):
+        """numba model and jacobian match numpy and finite differences"""
+        x = np.linspace(-125, 125, 301)
+        params = (3.0, 30.0, 2.0, 0.005)
+        expected = params[0] * np.exp(-x**2 / (2 * params[1]**2)) + params[2] + params[3] * x
+        self.assertTrue(np.allclose(numba_gaussian_peak(x, *params), expected))
+        self.assertTrue(np.allclose(numba_gaussian_peak(x, *params[:3]), expected - params[3] * x))
+
+        jac = numba_gaussian_peak_jacobian(x, *params, add_linear_term=True)
+        self.assertEqual(jac.shape, (x.size, 4))
+        for k in range(4):
+            step = 1e-6 * max(abs(params[k]), 1.0)
+            up, down = list(params), list(params)
+            up[k] += step
+            down[k] -= step
+            numeric = (numba_gaussian_peak(x, *up) - numba_gaussian_peak(x, *down)) / (2 * step)
+            self.assertTrue(np.allclose(jac[:, k], numeric, rtol=1e-5, atol=1e-8))
+
+        self.assertEqual(numba_gaussian_peak_jacobian(x, *params[:3]).shape, (x.size, 3))
+
+    def test_fit_mgii_line(self):
+        """Fits of real lines match a plain curve_fit and noise-only spectra are rejected"""
+        fit_results = fit_mgii_line(self.target_id, self.redshift, self.flux, self.ivar_flux,
+                                    self.model_flux, self.wavelength, self.lambda_width)
+
+        #- reference: the numpy model fit with finite-difference derivatives
+        mean_mgii_peak = (2803.5324 + 2796.3511) / 2
+        for i in np.flatnonzero(self.has_line):
+            x = self.wavelength - (1 + self.redshift[i]) * mean_mgii_peak
+            ii = np.abs(x) < self.lambda_width / 2
+            popt, pcov = curve_fit(lambda x, A, sigma, B: A * np.exp(-x**2 / (2 * sigma**2)) + B,
+                                   x[ii], self.flux[i][ii], sigma=1 / np.sqrt(self.ivar_flux[i][ii]),
+                                   p0=[1.0, self.lambda_width / 2, np.mean(self.flux[i][ii])])
+            self.assertTrue(np.allclose(fit_results[i, 1:4], popt, rtol=1e-4))
+            self.assertTrue(np.allclose(fit_results[i, 4:7], np.diag(pcov), rtol=1e-3))
+
+        #- only the spectra with a line pass the default selection
+        mask = create_mask_fit(fit_results, max_sigma=200, min_sigma=10, min_deltachi2=16,
+                               min_A=0, min_signifiance_A=3)
+        self.assertTrue(np.all(mask == self.has_line))
+
+if __name__ == '__main__':
+    unittest.main()
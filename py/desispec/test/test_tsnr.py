@@ -0,0 +1,197 @@
+"""
+Test desispec.tsnr
+"""
+
+import unittest
+import warnings
+
+import numpy as np
+from astropy.table import Table
+from astropy.convolution import convolve, Box1DKernel
+
+from desispec.frame import Frame
+from desispec.fiberflat import FiberFlat
+from desispec.sky import SkyModel
+from desispec.xytraceset import XYTraceSet
+from desispec.preproc import parse_sec_keyword
+from desispec.tsnr import _box_smooth, fb_rdnoise, var_model, _tsnr2_sum, calc_alpha
+
+class TestTSNR(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.flux = rng.normal(size=200)
+
+    def _make_variance_inputs(self, nfiber=10):
+        """rdnoise, nea, fiberflat and sky model with a variance comparable to the readnoise"""
+        rng = np.random.default_rng(2)
+        wave = np.arange(5000., 5600., 0.8)
+        nwave = wave.size
+        rdnoise_sigma = rng.uniform(2.5, 3.5, size=(nfiber, nwave))
+        npix_1d = rng.uniform(2.5, 3.5, size=nwave)
+        fiberflat = FiberFlat(wave, rng.uniform(0.9, 1.1, size=(nfiber, nwave)),
+                              np.ones((nfiber, nwave)))
+        skymodel = SkyModel(wave, rng.uniform(-1., 40., size=(nfiber, nwave)),
+                            np.ones((nfiber, nwave)), np.zeros((nfiber, nwave), dtype=np.int32))
+        return wave, rdnoise_sigma, npix_1d, fiberflat, skymodel
+
+    def test_box_smooth(self):
+        """_box_smooth matches astropy convolve for odd and even widths"""
+        for width in (3, 4, 15, 16):
+            with self.subTest(width=width):
+                expected = convolve(self.flux, Box1DKernel(width), boundary='extend')
+                smoothed = _box_smooth(self.flux, width)
+                self.assertTrue(np.allclose(smoothed, expected, rtol=0, atol=1e-12))
+
+    def test_box_smooth_nan(self):
+        """_box_smooth interpolates over NaNs like astropy convolve"""
+        #- includes a run of 3 NaNs, which stays NaN in its center for width=3
+        flux = self.flux.copy()
+        flux[[0, 50, 51, 52, 120, 199]] = np.nan
+        for width in (3, 4, 15, 16):
+            with self.subTest(width=width):
+                with warnings.catch_warnings():
+                    #- astropy warns about the NaN left by the run of 3 NaNs
+                    warnings.simplefilter('ignore')
+                    expected = convolve(flux, Box1DKernel(width), boundary='extend')
+                smoothed = _box_smooth(flux, width)
+                self.assertTrue(np.allclose(smoothed, expected, rtol=0, atol=1e-12,
+                                            equal_nan=True))
+
+    def test_fb_rdnoise(self):
+        """fb_rdnoise matches a per-fiber evaluation of the traces"""
+        #- 200x300 pixel CCD with 4 amps; the last fiber runs off the right edge
+        #- and all traces run off the top and bottom
+        nfiber = 8
+        wave = np.linspace(5000., 6000., 101)
+        xcoef = np.zeros((nfiber, 2))
+        xcoef[:, 0] = 10. + 27.*np.arange(nfiber)
+        xcoef[:, 1] = 5.
+        ycoef = np.zeros((nfiber, 2))
+        ycoef[:, 0] = 150.
+        ycoef[:, 1] = 160.
+        tset = XYTraceSet(xcoef, ycoef, wave[0], wave[-1], npix_y=300)
+
+        meta = dict()
+        for amp, ccdsec, rdnoise in [('A', '[1:100,1:150]', 3.0), ('B', '[101:200,1:150]', 3.5),
+                                     ('C', '[1:100,151:300]', 4.0), ('D', '[101:200,151:300]', 4.5)]:
+            meta['BIASSEC'+amp] = '[201:210,1:300]'
+            meta['CCDSEC'+amp] = ccdsec
+            meta['OBSRDN'+amp] = rdnoise
+        frame = Frame(wave, np.zeros((nfiber, wave.size)), np.ones((nfiber, wave.size)),
+                      fibers=np.arange(nfiber), meta=meta, suppress_res_warning=True)
+
+        #- reference: evaluate each fiber's trace separately
+        fibers = np.array([0, 2, 3, 7])
+        expected = np.zeros((nfiber, wave.size)) + 1000
+        for ifiber in fibers:
+            x = tset.x_vs_wave(fiber=ifiber, wavelength=wave)
+            y = tset.y_vs_wave(fiber=ifiber, wavelength=wave)
+            for amp in 'ABCD':
+                sec = parse_sec_keyword(meta['CCDSEC'+amp])
+                ii = (x>=sec[1].start)&(x<sec[1].stop)&(y>=sec[0].start)&(y<sec[0].stop)
+                expected[ifiber, ii] = meta['OBSRDN'+amp]
+
+        rdnoise = fb_rdnoise(fibers, frame, tset)
+        self.assertTrue(np.all(rdnoise == expected))
+        #- every amp and the off-CCD default are represented
+        self.assertEqual(set(np.unique(rdnoise[fibers])), {3.0, 3.5, 4.0, 4.5, 1000.})
+
+        #- a single fiber
+        self.assertTrue(np.all(fb_rdnoise([3], frame, tset) == np.where(
+            np.arange(nfiber)[:, None] == 3, expected, 1000)))
+
+    def test_var_model(self):
+        """var_model matches the reference variance model and leaves its inputs unchanged"""
+        wave, rdnoise_sigma, npix_1d, fiberflat, skymodel = self._make_variance_inputs()
+        angperpix, angperspecbin = 0.5, 0.8
+        inputs = (rdnoise_sigma.copy(), npix_1d.copy(), fiberflat.fiberflat.copy(),
+                  skymodel.flux.copy())
+
+        for alpha in (1.0, 1.3):
+            with self.subTest(alpha=alpha):
+                npix_2d = npix_1d * (angperspecbin / angperpix)
+                expected_rdnoise = alpha * rdnoise_sigma**2 * npix_2d / angperspecbin**2
+                expected_sky = fiberflat.fiberflat * np.abs(skymodel.flux)
+
+                rd_var, sky_var = var_model(rdnoise_sigma, npix_1d, angperpix, angperspecbin,
+                                            fiberflat, skymodel, alpha=alpha, components=True)
+                self.assertTrue(np.allclose(rd_var, expected_rdnoise, rtol=1e-12, atol=0))
+                self.assertTrue(np.allclose(sky_var, expected_sky, rtol=1e-12, atol=0))
+
+                var = var_model(rdnoise_sigma, npix_1d, angperpix, angperspecbin,
+                                fiberflat, skymodel, alpha=alpha)
+                self.assertTrue(np.allclose(var, expected_rdnoise + expected_sky, rtol=1e-12, atol=0))
+
+        #- evaluated in place on new arrays, not on the inputs
+        for before, after in zip(inputs, (rdnoise_sigma, npix_1d, fiberflat.fiberflat, skymodel.flux)):
+            self.assertTrue(np.all(before == after))
+
+    def test_tsnr2_sum(self):
+        """_tsnr2_sum matches the numpy expression, including masked pixels"""
+        rng = np.random.default_rng(1)
+        nfiber, nwave = 20, 300
+        dflux = rng.normal(size=(1, nwave))
+        calib = rng.uniform(1, 10, size=(nfiber, nwave))
+        fiberflat = rng.uniform(0.5, 1.5, size=(nfiber, nwave))
+        transmission = rng.uniform(0.8, 1.0, size=(nfiber, nwave))
+        fiberfrac = rng.uniform(0.3, 0.8, size=nfiber)
+        denom = rng.uniform(0.1, 2.0, size=(nfiber, nwave))
+        maskfactor = (rng.random(size=(nfiber, nwave)) > 0.2).astype(float)
+        maskfactor[3] = 0.0
+
+        expected = np.sum((dflux*calib*fiberflat*transmission*fiberfrac[:,None])**2 / denom * maskfactor,
+                          axis=1)
+        tsnr2 = _tsnr2_sum(np.broadcast_to(dflux, (nfiber, nwave)), calib, fiberflat,
+                           transmission, fiberfrac, denom, maskfactor)
+        self.assertTrue(np.allclose(tsnr2, expected, rtol=1e-12, atol=0))
+        self.assertEqual(tsnr2[3], 0.0)
+
+        #- broadcast views for no transmission / fiberfrac corrections
+        expected = np.sum((dflux*calib*fiberflat)**2 / denom * maskfactor, axis=1)
+        tsnr2 = _tsnr2_sum(np.broadcast_to(dflux, (nfiber, nwave)), calib, fiberflat,
+                           np.broadcast_to(1.0, (nfiber, nwave)), np.broadcast_to(1.0, (nfiber,)),
+                           denom, maskfactor)
+        self.assertTrue(np.allclose(tsnr2, expected, rtol=1e-12, atol=0))
+
+        #- zero variance follows numpy (inf), rather than raising ZeroDivisionError
+        denom[0, 0] = 0.0
+        maskfactor[0, 0] = 1.0
+        tsnr2 = _tsnr2_sum(np.broadcast_to(dflux, (nfiber, nwave)), calib, fiberflat,
+                           transmission, fiberfrac, denom, maskfactor)
+        self.assertTrue(np.isinf(tsnr2[0]))
+        self.assertTrue(np.all(np.isfinite(tsnr2[1:])))
+
+    def test_calc_alpha(self):
+        """calc_alpha recovers the readnoise scaling of the sky fiber variance"""
+        nfiber = 10
+        wave, rdnoise_sigma, npix_1d, fiberflat, skymodel = self._make_variance_inputs(nfiber)
+        angperpix, angperspecbin = 0.5, 0.8
+        fibermap = Table()
+        fibermap['OBJTYPE'] = np.where(np.arange(nfiber) % 2 == 0, 'SKY', 'TGT')
+
+        #- true alpha outside of the initial (0.8, 1.2) bracket
+        true_alpha = 1.3
+        rd_var = rdnoise_sigma**2 * npix_1d / (angperpix * angperspecbin)
+        sky_var = fiberflat.fiberflat * np.abs(skymodel.flux)
+        ivar = 1.0 / (true_alpha * rd_var + sky_var)
+        #- target fibers and masked pixels must not affect the fit
+        ivar[1::2] *= 10
+        mask = np.zeros((nfiber, wave.size), dtype=np.int32)
+        mask[0, 100:200] = 1
+        ivar[0, 100:200] = 1e-6
+        frame = Frame(wave, np.zeros((nfiber, wave.size)), ivar, mask=mask,
+                      fibers=np.arange(nfiber), suppress_res_warning=True)
+
+        alpha = calc_alpha(frame, fibermap, rdnoise_sigma, npix_1d, angperpix, angperspecbin,
+                           fiberflat, skymodel)
+        self.assertAlmostEqual(alpha, true_alpha, places=4)
+
+        #- no unmasked sky pixels falls back to alpha = 1
+        frame.mask[0::2] = 1
+        alpha = calc_alpha(frame, fibermap, rdnoise_sigma, npix_1d, angperpix, angperspecbin,
+                           fiberflat, skymodel)
+        self.assertEqual(alpha, 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
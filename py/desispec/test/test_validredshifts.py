@@ -0,0 +1,117 @@
+"""
+Test desispec.validredshifts
+"""
+
+import os
+import unittest
+import tempfile
+from shutil import rmtree, copyfile
+
+import numpy as np
+import fitsio
+
+from desispec.validredshifts import validate
+
+class TestValidRedshifts(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        #- synthetic main survey redrock file with all afterburner files
+        cls.testdir = tempfile.mkdtemp()
+        cls.redrock_path = os.path.join(cls.testdir, 'redrock-0-1-thru20210101.fits')
+
+        rng = np.random.default_rng(0)
+        n = 200
+        targetid = 39627000000000000 + np.arange(n)
+
+        redshifts = np.zeros(n, dtype=[('TARGETID', '>i8'), ('CHI2', '>f8'), ('Z', '>f8'),
+                                       ('ZERR', '>f8'), ('ZWARN', '>i8'), ('SPECTYPE', 'S6'),
+                                       ('DELTACHI2', '>f8')])
+        redshifts['TARGETID'] = targetid
+        redshifts['Z'] = rng.uniform(0, 4, n)
+        redshifts['ZERR'] = rng.uniform(0, 1e-3, n)
+        redshifts['ZWARN'] = rng.choice([0, 0, 0, 4], n)
+        redshifts['SPECTYPE'] = rng.choice(['GALAXY', 'QSO', 'STAR'], n)
+        redshifts['DELTACHI2'] = rng.uniform(0, 100, n)
+
+        fibermap = np.zeros(n, dtype=[('TARGETID', '>i8'), ('COADD_FIBERSTATUS', '>i4'),
+                                      ('TARGET_RA', '>f8'), ('TARGET_DEC', '>f8'),
+                                      ('DESI_TARGET', '>i8'), ('BGS_TARGET', '>i8'),
+                                      ('MWS_TARGET', '>i8')])
+        fibermap['TARGETID'] = targetid
+        fibermap['COADD_FIBERSTATUS'] = rng.choice([0, 0, 0, 1], n)
+        fibermap['DESI_TARGET'] = rng.integers(0, 2**8, n)
+        fibermap['BGS_TARGET'] = rng.integers(0, 4, n)
+
+        emline = np.zeros(n, dtype=[('TARGETID', '>i8'), ('OII_FLUX', '>f4'),
+                                    ('OII_FLUX_IVAR', '>f4')])
+        emline['TARGETID'] = targetid
+        emline['OII_FLUX'] = rng.normal(5, 10, n)
+        emline['OII_FLUX_IVAR'] = rng.uniform(0, 1, n)
+
+        qso_mgii = np.zeros(n, dtype=[('TARGETID', '>i8'), ('IS_QSO_MGII', '?')])
+        qso_mgii['TARGETID'] = targetid
+        qso_mgii['IS_QSO_MGII'] = rng.random(n) > 0.8
+
+        qn_columns = ['C_LYA', 'C_CIV', 'C_CIII', 'C_MgII', 'C_Hbeta', 'C_Halpha']
+        qso_qn = np.zeros(n, dtype=[('TARGETID', '>i8'), ('Z_NEW', '>f8'), ('ZERR_NEW', '>f8'),
+                                    ('IS_QSO_QN_NEW_RR', '?')] + [(c, '>f4') for c in qn_columns])
+        qso_qn['TARGETID'] = targetid
+        qso_qn['Z_NEW'] = rng.uniform(0, 4, n)
+        qso_qn['ZERR_NEW'] = rng.uniform(0, 1e-3, n)
+        qso_qn['IS_QSO_QN_NEW_RR'] = rng.random(n) > 0.5
+        for c in qn_columns:
+            qso_qn[c] = rng.random(n)
+
+        fitsio.write(cls.redrock_path, redshifts, extname='REDSHIFTS')
+        fitsio.write(cls.redrock_path, fibermap, extname='FIBERMAP')
+        for prefix, data, extname in [('emline-', emline, 'EMLINEFIT'),
+                                      ('qso_mgii-', qso_mgii, 'MGII'),
+                                      ('qso_qn-', qso_qn, 'QN_RR')]:
+            filename = cls.redrock_path.replace('redrock-', prefix)
+            fitsio.write(filename, data, extname=extname)
+
+        cls.nrows = n
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.testdir):
+            rmtree(cls.testdir)
+
+    def test_validate_rows(self):
+        """validate(rows=...) matches slicing the validation of the full file"""
+        rows = np.array([0, 3, 4, 17, 50, 51, 120, self.nrows-1])
+        for kwargs in [dict(), dict(fiberstatus_cut=False), dict(return_target_columns=True)]:
+            with self.subTest(**kwargs):
+                full = validate(self.redrock_path, **kwargs)
+                subset = validate(self.redrock_path, rows=rows, **kwargs)
+                self.assertEqual(full.colnames, subset.colnames)
+                self.assertEqual(len(subset), len(rows))
+                for col in full.colnames:
+                    self.assertTrue(np.all(full[col][rows] == subset[col]), col)
+
+    def test_validate_mismatched_afterburner(self):
+        """validate fails clearly if an afterburner file doesn't match the redrock file"""
+        testdir = tempfile.mkdtemp(dir=self.testdir)
+        redrock_path = os.path.join(testdir, os.path.basename(self.redrock_path))
+        for prefix in ('redrock-', 'emline-', 'qso_mgii-', 'qso_qn-'):
+            copyfile(self.redrock_path.replace('redrock-', prefix),
+                     redrock_path.replace('redrock-', prefix))
+
+        qso_qn_path = redrock_path.replace('redrock-', 'qso_qn-')
+        qso_qn = fitsio.read(qso_qn_path, ext='QN_RR')
+
+        #- one row short: error names the file rather than failing to broadcast
+        fitsio.write(qso_qn_path, qso_qn[:-1], extname='QN_RR', clobber=True)
+        with self.assertRaises(ValueError) as cm:
+            validate(redrock_path)
+        self.assertIn(qso_qn_path, str(cm.exception))
+
+        #- same rows but a different TARGETID
+        qso_qn['TARGETID'][5] += 1
+        fitsio.write(qso_qn_path, qso_qn, extname='QN_RR', clobber=True)
+        with self.assertRaises(AssertionError):
+            validate(redrock_path)
+
+if __name__ == '__main__':
+    unittest.main()
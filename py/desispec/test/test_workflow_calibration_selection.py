@@ -20,41 +20,38 @@ class TestWorkflowCalibrationSelection(unittest.TestCase):
     def tearDownClass(cls):
         pass
 
+    def setUp(self):
+        ## Two good arc+flat sets that tests copy before modifying
+        self._base_set1 = self._make_arcflatset_etable()
+        self._base_set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
+
     def _make_arcset_etable(self, narcsperset=5, expid_offset=0, mjd=55555.0,
                             minutes_offset=0.):
         mjd_offset = minutes_offset / (24. * 60.)
         ntotalarcs = 2 * narcsperset
-        arcset = Table()
-
-        expids = list(np.arange(expid_offset, expid_offset + narcsperset)) \
-                 + list(np.arange(expid_offset + 2 + narcsperset,
-                                  expid_offset + 2 + ntotalarcs))
-        arcset["EXPID"] = expids
-
-        seqnums = list(1 + np.arange(ntotalarcs))
-        arcset['SEQNUM'] = seqnums
-
-        seqtots = list(np.ones(narcsperset, dtype=int) * narcsperset) \
-                  + list(np.ones(narcsperset, dtype=int) * narcsperset)
-        arcset['SEQTOT'] = seqtots
 
-        arcset['LASTSTEP'] = ['ignore'] * ntotalarcs
-        arcset['LASTSTEP'][:] = 'all'
-        arcset['CAMWORD'] = 'a0123456789'
-        arcset['BADCAMWORD'] = ['b0123456789r0123456789'] * ntotalarcs
-        arcset['BADCAMWORD'][:] = ''
-        arcset['BADAMPS'] = ['b0123456789r0123456789'] * ntotalarcs
-        arcset['BADAMPS'][:] = ''
-
-        arcset['EXPTIME'] = [5.0] * narcsperset + [30.1] * narcsperset
-
-        arcset['PROGRAM'] = ['calib short arcs all'] * narcsperset \
-                            + ['calib long arcs cd+xe'] * narcsperset
-
-        obs = ['arc'] * ntotalarcs
-        arcset['OBSTYPE'] = obs
-        perexp_mjd_offsets = np.cumsum(arcset['EXPTIME']+60.0) / (24*3600)
-        arcset['MJD-OBS'] = mjd + mjd_offset + perexp_mjd_offsets
+        expids = np.concatenate([
+            np.arange(expid_offset, expid_offset + narcsperset),
+            np.arange(expid_offset + 2 + narcsperset,
+                      expid_offset + 2 + ntotalarcs)])
+        exptimes = np.repeat([5.0, 30.1], narcsperset)
+        perexp_mjd_offsets = np.cumsum(exptimes+60.0) / (24*3600)
+
+        ## string widths leave room for tests to later set 'ignore' and bad cams/amps
+        arcset = Table({
+            'EXPID': expids,
+            'SEQNUM': 1 + np.arange(ntotalarcs),
+            'SEQTOT': np.full(ntotalarcs, narcsperset),
+            'LASTSTEP': np.full(ntotalarcs, 'all', dtype='U6'),
+            'CAMWORD': np.full(ntotalarcs, 'a0123456789'),
+            'BADCAMWORD': np.full(ntotalarcs, '', dtype='U22'),
+            'BADAMPS': np.full(ntotalarcs, '', dtype='U22'),
+            'EXPTIME': exptimes,
+            'PROGRAM': np.repeat(['calib short arcs all', 'calib long arcs cd+xe'],
+                                 narcsperset),
+            'OBSTYPE': np.full(ntotalarcs, 'arc'),
+            'MJD-OBS': mjd + mjd_offset + perexp_mjd_offsets,
+            })
 
         return arcset
 
@@ -62,35 +59,35 @@ class TestWorkflowCalibrationSelection(unittest.TestCase):
                              flatflatgap=3, expid_offset=0, mjd=55555.0,
                              minutes_offset=0.):
         mjd_offset = minutes_offset/(24.*60.)
-        flatset = Table()
         ncte = 3
-        nexps = nflatsperset * nflatsets + ncte
+        nflats = nflatsperset * nflatsets
+        nexps = nflats + ncte
         flatitteroffset = nflatsperset + flatflatgap - 1
 
-        expids, seqnums, seqtots, progs = list(), list(), list(), list()
-        for fset in range(nflatsets):
-            fulloffset = expid_offset + fset * flatitteroffset
-            expids += list(np.arange(fulloffset, fulloffset + nflatsperset))
-            seqnums += list(1 + np.arange(nflatsperset))
-            seqtots += list(np.ones(nflatsperset, dtype=int) * nflatsperset)
-            progs += [f'calib desi-calib-0{fset} leds only'] * nflatsperset
-
-        flatset["EXPID"] = expids + list(range(np.max(expids)+1,np.max(expids)+ncte+1))
-        flatset['SEQNUM'] = seqnums + [1]*ncte
-        flatset['SEQTOT'] = seqtots + [1]*ncte
-        flatset['PROGRAM'] = progs + ['led03 flat for cte check']*ncte
-        flatset['EXPTIME'] = [120.0] * (nflatsperset*nflatsets) + [1.0]*ncte
-
-        flatset['LASTSTEP'] = ['ignore'] * nexps
-        flatset['LASTSTEP'][:] = 'all'
-        flatset['CAMWORD'] = 'a0123456789'
-        flatset['BADCAMWORD'] = ['b0123456789r0123456789'] * nexps
-        flatset['BADCAMWORD'][:] = ''
-        flatset['BADAMPS'] = ['b0123456789r0123456789'] * nexps
-        flatset['BADAMPS'][:] = ''
-        flatset['OBSTYPE'] = ['flat'] * nexps
-        perexp_mjd_offsets = np.cumsum(flatset['EXPTIME']+60.0) / (24*3600)
-        flatset['MJD-OBS'] = mjd + mjd_offset + perexp_mjd_offsets
+        fulloffsets = expid_offset + np.arange(nflatsets) * flatitteroffset
+        expids = (fulloffsets[:, None] + np.arange(nflatsperset)[None, :]).ravel()
+        expids = np.concatenate([expids, np.max(expids) + 1 + np.arange(ncte)])
+        progs = [f'calib desi-calib-0{fset} leds only' for fset in range(nflatsets)]
+        exptimes = np.repeat([120.0, 1.0], [nflats, ncte])
+        perexp_mjd_offsets = np.cumsum(exptimes+60.0) / (24*3600)
+
+        ## string widths leave room for tests to later set 'ignore' and bad cams/amps
+        flatset = Table({
+            'EXPID': expids,
+            'SEQNUM': np.concatenate([np.tile(1 + np.arange(nflatsperset), nflatsets),
+                                      np.ones(ncte, dtype=int)]),
+            'SEQTOT': np.concatenate([np.full(nflats, nflatsperset),
+                                      np.ones(ncte, dtype=int)]),
+            'PROGRAM': np.concatenate([np.repeat(progs, nflatsperset),
+                                       np.full(ncte, 'led03 flat for cte check')]),
+            'EXPTIME': exptimes,
+            'LASTSTEP': np.full(nexps, 'all', dtype='U6'),
+            'CAMWORD': np.full(nexps, 'a0123456789'),
+            'BADCAMWORD': np.full(nexps, '', dtype='U22'),
+            'BADAMPS': np.full(nexps, '', dtype='U22'),
+            'OBSTYPE': np.full(nexps, 'flat'),
+            'MJD-OBS': mjd + mjd_offset + perexp_mjd_offsets,
+            })
 
         return flatset
 
@@ -115,6 +112,8 @@ class TestWorkflowCalibrationSelection(unittest.TestCase):
     def _get_cleaned_table(self, tab):
         from desispec.workflow.calibration_selection import \
             select_valid_calib_exposures
+        ## ignored exposures can never be selected, so drop them up front
+        tab = tab[np.asarray(tab['LASTSTEP']) != 'ignore']
         cleaned_table, exptypes = select_valid_calib_exposures(tab)
         return cleaned_table[exptypes!='cteflat']
     
@@ -127,193 +126,211 @@ class TestWorkflowCalibrationSelection(unittest.TestCase):
             find_best_arc_flat_sets
         ## Two good sets
         ## Should select first set since it came first
-        set1 = self._make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        for erow in vstack([set1, set2]):
-            print(list(erow))
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='two good sets'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First good, second has ignored long arc
         ## Should select first set since long arcs don't matter
-        # set1 = make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        set2['LASTSTEP'][7] = 'ignore'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second has ignored long arc'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set2['LASTSTEP'][7] = 'ignore'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First good, second has bad short arc
         ## Should select first set since want full set of short arcs
-        # set1 = make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        set2['LASTSTEP'][2] = 'ignore'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second has bad short arc'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set2['LASTSTEP'][2] = 'ignore'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First good, second has exposures with a badc camera
         ## Should select first set since second has some bad data
-        # set1 = make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        set2['BADCAMWORD'][::4] = 'r3'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second has bad cameras'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set2['BADCAMWORD'][::4] = 'r3'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First good, second has bad exp and bad cams
         ## Should select first set since second has multiple issues
-        # set1 = make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        set2['LASTSTEP'][2] = 'ignore'
-        set2['BADCAMWORD'][::4] = 'r3'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second has bad exposure and cameras'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set2['LASTSTEP'][2] = 'ignore'
+            set2['BADCAMWORD'][::4] = 'r3'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First good, second has bad amp
         ## Should select first set since second has a bad amp
-        # set1 = make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        set2['BADAMPS'][14] = 'b3A'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second has bad amp'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set2['BADAMPS'][14] = 'b3A'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First good, second has bad exp and bad amps
         ## Should select first set since second has multiple issues
-        # set1 = make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        set2['LASTSTEP'][2] = 'ignore'
-        set2['BADAMPS'][14] = 'b3A'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second has bad exposure and amps'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set2['LASTSTEP'][2] = 'ignore'
+            set2['BADAMPS'][14] = 'b3A'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## The same set of tests, but setting the first table with the issue
         ## to ensure it now picks up the second
 
         ## First has bad long arc, second good
         ## Should select first set since we don't care about log cals
-        set1 = self._make_arcflatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        set1['LASTSTEP'][7] = 'ignore'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first has ignored long arc'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set1['LASTSTEP'][7] = 'ignore'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First has bad short arc, second good
         ## Should select second set since first has bad exp
-        set1 = self._make_arcflatset_etable()
-        # set2 = make_arcflatset_etable(expid_offset=40)
-        set1['LASTSTEP'][2] = 'ignore'
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first has bad short arc'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set1['LASTSTEP'][2] = 'ignore'
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First has bad cameras, second good
         ## Should select second set since first has bad cameras
-        set1 = self._make_arcflatset_etable()
-        # set2 = make_arcflatset_etable(expid_offset=40)
-        set1['BADCAMWORD'][::4] = 'r3'
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first has bad cameras'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set1['BADCAMWORD'][::4] = 'r3'
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First has bad exposure and cameras, second good
         ## Should select second set since first has issues
-        set1 = self._make_arcflatset_etable()
-        # set2 = make_arcflatset_etable(expid_offset=40)
-        set1['LASTSTEP'][2] = 'ignore'
-        set1['BADCAMWORD'][::4] = 'r3'
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first has bad exposure and cameras'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set1['LASTSTEP'][2] = 'ignore'
+            set1['BADCAMWORD'][::4] = 'r3'
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First has bad cameras, second good
         ## Should select second set since first has bad cameras
-        set1 = self._make_arcflatset_etable()
-        # set2 = make_arcflatset_etable(expid_offset=40)
-        set1['BADAMPS'][14] = 'b3A'
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first has bad amp'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set1['BADAMPS'][14] = 'b3A'
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First has bad exposure and bad amps, second good
         ## Should select second set since first has issues
-        set1 = self._make_arcflatset_etable()
-        # set2 = make_arcflatset_etable(expid_offset=40)
-        set1['LASTSTEP'][2] = 'ignore'
-        set1['BADAMPS'][14] = 'b3A'
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first has bad exposure and amps'):
+            set1 = self._base_set1.copy()
+            set2 = self._base_set2.copy()
+            set1['LASTSTEP'][2] = 'ignore'
+            set1['BADAMPS'][14] = 'b3A'
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## Now test cases with a complete set and an incomplete set
 
         ## First only arcs, second complete
         ## Should select second set since complete
-        set1 = self._make_arcset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first only arcs'):
+            set1 = self._make_arcset_etable()
+            set2 = self._base_set2.copy()
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First complete with bad exposure, second only arcs
         ## Should select first set since one bad arc is acceptable and has flats
-        set1 = self._make_arcflatset_etable()
-        set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
-        set1['LASTSTEP'][2] = 'ignore'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second only arcs, first has one bad arc'):
+            set1 = self._base_set1.copy()
+            set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
+            set1['LASTSTEP'][2] = 'ignore'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First complete with first two short arcs bad, second only arc set
         ## Should select first set since can use as few as 3 arcs for fit
-        set1 = self._make_arcflatset_etable()
-        set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
-        set1['LASTSTEP'][:2] = 'ignore'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second only arcs, first has two bad arcs'):
+            set1 = self._base_set1.copy()
+            set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
+            set1['LASTSTEP'][:2] = 'ignore'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First complete with first three short arcs bad, second only arc set
         ## Should select second set since 2 short arcs aren't enough
-        set1 = self._make_arcflatset_etable()
-        set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
-        set1['LASTSTEP'][:3] = 'ignore'
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second only arcs, first has three bad arcs'):
+            set1 = self._base_set1.copy()
+            set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
+            set1['LASTSTEP'][:3] = 'ignore'
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First just flats, second full set but with issues
         ## Should select second set since can use 4 arcs and one bad amp is okay
-        set1 = self._make_flatset_etable()
-        set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=240.)
-        set2['LASTSTEP'][2] = 'ignore'
-        set2['BADAMPS'][14] = 'b3A'
-        expected = self. _get_cleaned_table(set2)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='first only flats'):
+            set1 = self._make_flatset_etable()
+            set2 = self._make_arcflatset_etable(expid_offset=50, minutes_offset=240.)
+            set2['LASTSTEP'][2] = 'ignore'
+            set2['BADAMPS'][14] = 'b3A'
+            expected = self._get_cleaned_table(set2)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## First full set with issues, second just flat
         ## Should select first set since 4 good arcs is fine and one badamp is okay
-        set1 = self._make_arcflatset_etable()
-        set2 = self._make_flatset_etable(expid_offset=50, minutes_offset=240.)
-        set1['LASTSTEP'][2] = 'ignore'
-        set1['BADAMPS'][14] = 'b3A'
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='second only flats'):
+            set1 = self._base_set1.copy()
+            set2 = self._make_flatset_etable(expid_offset=50, minutes_offset=240.)
+            set1['LASTSTEP'][2] = 'ignore'
+            set1['BADAMPS'][14] = 'b3A'
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
         ## Two sets of equivalent only arcs, no flats
         ## Should just pick the first
-        set1 = self._make_arcset_etable()
-        set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
-        expected = self. _get_cleaned_table(set1)
-        best = find_best_arc_flat_sets(vstack([set1, set2]))
-        self._test_tables_equal(expected, best)
+        with self.subTest(case='two arc only sets'):
+            set1 = self._make_arcset_etable()
+            set2 = self._make_arcset_etable(expid_offset=50, minutes_offset=240.)
+            expected = self._get_cleaned_table(set1)
+            best = find_best_arc_flat_sets(vstack([set1, set2]))
+            self._test_tables_equal(expected, best)
 
     def test_extra_badcals(self):
         """
@@ -321,8 +338,8 @@ class TestWorkflowCalibrationSelection(unittest.TestCase):
         """
         from desispec.workflow.calibration_selection import \
             find_best_arc_flat_sets
-        goodset = self._make_arcflatset_etable()
-        badset = self._make_arcflatset_etable(expid_offset=50, minutes_offset=120.)
+        goodset = self._base_set1.copy()
+        badset = self._base_set2.copy()
         badset['LASTSTEP'] = 'ignore'
         badarcs = badset[badset['OBSTYPE'] == 'arc']
         badflats = badset[badset['OBSTYPE'] == 'flat']
@@ -555,4 +572,24 @@ class TestWorkflowCalibrationSelection(unittest.TestCase):
         self.assertEqual(dark_expid, 3)
         self.assertTrue(np.all(etable == orig_etable))
 
-
+    def test_bytes_columns(self):
+        """OBSTYPE and PROGRAM as bytes columns select the same calibrations"""
+        from desispec.workflow.calibration_selection import \
+            select_valid_calib_exposures, find_best_arc_flat_sets
+        etable = vstack([self._base_set1, self._base_set2])
+        betable = etable.copy()
+        for col in ('OBSTYPE', 'PROGRAM'):
+            betable[col] = np.char.encode(np.asarray(etable[col]))
+            self.assertEqual(betable[col].dtype.kind, 'S')
+
+        ## includes the CTE flats, which check 'cte' in PROGRAM
+        cals, exptypes = select_valid_calib_exposures(etable)
+        bcals, bexptypes = select_valid_calib_exposures(betable)
+        self.assertIn('cteflat', exptypes)
+        self.assertTrue(np.all(exptypes == bexptypes))
+        self._test_tables_equal(cals, bcals)
+
+        best = find_best_arc_flat_sets(etable)
+        bbest = find_best_arc_flat_sets(betable)
+        self.assertGreater(len(best), 0)
+        self._test_tables_equal(best, bbest)
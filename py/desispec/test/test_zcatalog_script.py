@@ -0,0 +1,126 @@
+"""
+Test desispec.scripts.zcatalog
+"""
+
+import unittest
+
+import numpy as np
+from astropy.table import Table
+
+from desispec.scripts.zcatalog import (_hstack_arrays, _insert_columns, _vstack_tables,
+                                       _get_firstnight)
+
+class TestZCatalogScript(unittest.TestCase):
+
+    def test_hstack_arrays(self):
+        """_hstack_arrays combines columns, keeping only the first TARGETID"""
+        redshifts = np.zeros(3, dtype=[('TARGETID', 'i8'), ('Z', 'f8')])
+        redshifts['TARGETID'] = [10, 20, 30]
+        redshifts['Z'] = [0.1, 0.2, 0.3]
+        fibermap = Table()
+        fibermap['TARGETID'] = [10, 20, 30]
+        fibermap['FLUX'] = np.arange(6, dtype='f4').reshape(3, 2)
+
+        data = _hstack_arrays([redshifts, fibermap])
+        self.assertEqual(data.dtype.names, ('TARGETID', 'Z', 'FLUX'))
+        self.assertEqual(data['FLUX'].shape, (3, 2))
+        self.assertTrue(np.all(data['TARGETID'] == redshifts['TARGETID']))
+        self.assertTrue(np.all(data['FLUX'] == fibermap['FLUX']))
+
+        #- a duplicate column other than TARGETID names the column and file
+        fibermap['Z'] = [1.0, 2.0, 3.0]
+        with self.assertRaises(ValueError) as cm:
+            _hstack_arrays([redshifts, fibermap], filename='redrock-0-1.fits')
+        self.assertIn('Z', str(cm.exception))
+        self.assertIn('redrock-0-1.fits', str(cm.exception))
+
+    def test_insert_columns(self):
+        """_insert_columns matches sequential Table.add_column calls"""
+        data = Table()
+        data['A'] = [1, 2, 3]
+        data['B'] = [1.0, 2.0, 3.0]
+        data['C'] = ['x', 'y', 'z']
+        newcols = [(0, 'FIRST', np.array([7, 8, 9])),
+                   (2, 'MIDDLE', np.float32(0.5)),
+                   (5, 'LAST', np.arange(6).reshape(3, 2))]
+
+        expected = data.copy()
+        for index, name, value in newcols:
+            expected.add_column(value, index=index, name=name)
+
+        out = _insert_columns(data, newcols)
+        self.assertIsInstance(out, np.ndarray)
+        self.assertEqual(out.dtype.names, tuple(expected.colnames))
+        for name in expected.colnames:
+            self.assertTrue(np.all(out[name] == expected[name]), name)
+        self.assertEqual(out['MIDDLE'].dtype, np.float32)
+        self.assertEqual(out['LAST'].shape, (3, 2))
+
+    def test_vstack_tables(self):
+        """_vstack_tables stacks same-column inputs with promoted dtypes"""
+        t1 = np.zeros(2, dtype=[('TARGETID', 'i4'), ('Z', 'f4'), ('NAME', 'U3')])
+        t1['TARGETID'] = [1, 2]
+        t1['Z'] = [0.5, 1.5]
+        t1['NAME'] = ['a', 'bb']
+        t2 = Table()
+        t2['TARGETID'] = np.array([3], dtype='i8')
+        t2['Z'] = np.array([2.5], dtype='f8')
+        t2['NAME'] = ['cccc']
+
+        tables = [t1, t2]
+        data = _vstack_tables(tables)
+        self.assertNotIsInstance(data, np.ma.MaskedArray)
+        self.assertEqual(data['TARGETID'].dtype, np.int64)
+        self.assertEqual(data['Z'].dtype, np.float64)
+        self.assertEqual(data['NAME'].dtype, np.dtype('U4'))
+        self.assertEqual(list(data['TARGETID']), [1, 2, 3])
+        self.assertEqual(list(data['NAME']), ['a', 'bb', 'cccc'])
+        #- inputs are released as they are copied
+        self.assertEqual(tables, [None, None])
+
+    def test_vstack_tables_fallback(self):
+        """_vstack_tables falls back to astropy vstack when columns differ"""
+        t1 = np.zeros(2, dtype=[('TARGETID', 'i8'), ('Z', 'f8')])
+        t1['TARGETID'] = [1, 2]
+        t2 = np.zeros(1, dtype=[('TARGETID', 'i8'), ('Z', 'f8'), ('EXTRA', 'f4')])
+        t2['TARGETID'] = [3]
+        t2['EXTRA'] = [4.0]
+
+        data = _vstack_tables([t1, t2])
+        self.assertIsInstance(data, np.ma.MaskedArray)
+        self.assertEqual(data.dtype.names, ('TARGETID', 'Z', 'EXTRA'))
+        self.assertEqual(list(data['TARGETID']), [1, 2, 3])
+        self.assertEqual(list(data['EXTRA'].mask), [True, True, False])
+        self.assertEqual(data['EXTRA'][2], 4.0)
+
+    def test_get_firstnight(self):
+        """_get_firstnight finds the earliest exposure night of each tile"""
+        #- exposures of several tiles, in unsorted TILEID and NIGHT order
+        exp_fibermaps = list()
+        for tileids, nights in [([300, 100, 300], [20210105, 20210103, 20210102]),
+                                ([200, 100], [20210101, 20210104]),
+                                ([300, 200], [20210106, 20210107])]:
+            expfm = Table()
+            expfm['TILEID'] = np.array(tileids, dtype=np.int32)
+            expfm['NIGHT'] = np.array(nights, dtype=np.int32)
+            exp_fibermaps.append(expfm)
+
+        tileids = np.array([300, 100, 200, 300, 100])
+        firstnight = _get_firstnight(tileids, exp_fibermaps)
+        self.assertEqual(firstnight.dtype, np.int32)
+        self.assertEqual(list(firstnight),
+                         [20210102, 20210103, 20210101, 20210102, 20210103])
+
+        #- a TILEID without exposures is an error, including past the last tile
+        for missing in (150, 50, 400):
+            with self.subTest(missing=missing):
+                with self.assertRaises(ValueError) as cm:
+                    _get_firstnight(np.array([100, missing, 300]), exp_fibermaps)
+                self.assertIn(str(missing), str(cm.exception))
+
+        #- no exposures at all
+        with self.assertRaises(ValueError):
+            _get_firstnight(tileids, [exp_fibermaps[0][:0]])
+
+if __name__ == '__main__':
+    unittest.main()
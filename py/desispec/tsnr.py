@@ -5,6 +5,7 @@ desispec.tsnr
 """
 import os
 import numpy as np
+import numba
 import time
 import desispec
 
@@ -16,7 +17,7 @@ import glob
 import yaml
 from importlib import resources
 
-from scipy.optimize import minimize
+from scipy.optimize import minimize_scalar
 from scipy.interpolate import RectBivariateSpline,interp1d
 from scipy.signal import fftconvolve
 from desiutil.log import get_logger
@@ -407,7 +408,52 @@ class template_ensemble(object):
 
         log.info('Successfully written to '+filename)
 
-_tsnr_ensembles = None
+def _box_smooth(flux, width):
+    '''
+    Boxcar smooth flux with a running mean, equivalent to
+    astropy convolve(flux, Box1DKernel(width), boundary='extend')
+
+    Args:
+        flux: 1D array to smooth
+        width (int): width of the boxcar
+
+    Returns:
+        smoothed 1D float64 array, same length as flux
+
+    As for astropy convolve, NaN pixels are interpolated over by
+    renormalizing the kernel to the finite pixels in each window.
+    '''
+    from scipy.ndimage import uniform_filter1d
+
+    def boxcar(x):
+        if width % 2 == 1:
+            return uniform_filter1d(x, width, mode='nearest')
+        else:
+            #- an even width Box1DKernel has width+1 taps with half weights at both ends,
+            #- i.e. the weighted average of odd boxcars of width+1 and width-1
+            wide = uniform_filter1d(x, width+1, mode='nearest')
+            narrow = uniform_filter1d(x, width-1, mode='nearest')
+            return ((width+1)*wide + (width-1)*narrow) / (2*width)
+
+    flux = np.asarray(flux, dtype=float)
+    finite = np.isfinite(flux)
+    if np.all(finite):
+        return boxcar(flux)
+
+    #- NaNs would propagate through the running sum, so smooth the zero-filled
+    #- flux and divide by the smoothed weights of the finite pixels
+    numerator = boxcar(np.where(finite, flux, 0.0))
+    denominator = boxcar(finite.astype(float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        smoothed = numerator / denominator
+
+    #- windows without any finite pixels stay NaN
+    smoothed[denominator <= 0] = np.nan
+
+    return smoothed
+
+#- Cache of ensembles keyed by (dirpath, smooth) to avoid re-reading the files for every frame
+_tsnr_ensembles = dict()
 def get_ensemble(dirpath=None, smooth=0):
     '''
     Read TSNR ensembles from $DESIMODEL/data/tsnr
@@ -421,25 +467,21 @@ def get_ensemble(dirpath=None, smooth=0):
         is a Spectra class instance with wave, flux for BRZ arms.  Note flux is the high
         frequency residual for the ensemble.  See doc. 4723.
     '''
-    #- Deferred import for faster module import
-    from astropy.convolution import convolve, Box1DKernel
-
     log = get_logger()
 
-    global _tsnr_ensembles
-    if _tsnr_ensembles is not None:
+    if dirpath is None :
+        dirpath = os.path.join(os.environ["DESIMODEL"],"data/tsnr")
+
+    cachekey = (os.path.abspath(dirpath), smooth)
+    if cachekey in _tsnr_ensembles:
         log.debug('Using cached TSNR ensemble')
-        return _tsnr_ensembles
+        return _tsnr_ensembles[cachekey]
 
     #- all ensembles have these bands
     bands = ('b', 'r', 'z')
 
     t0 = time.time()
 
-    log=get_logger()
-    if dirpath is None :
-        dirpath = os.path.join(os.environ["DESIMODEL"],"data/tsnr")
-
     log.info('Reading TSNR ensemble files from %s', dirpath)
 
     paths = sorted(glob.glob(dirpath + '/tsnr-ensemble-*.fits'))
@@ -468,13 +510,13 @@ def get_ensemble(dirpath=None, smooth=0):
 
                 # 125: 100. A in 0.8 pixel.
                 if smooth > 0:
-                    flux[band] = convolve(flux[band][0,:], Box1DKernel(smooth), boundary='extend')
+                    flux[band] = _box_smooth(flux[band][0,:], smooth)
                     flux[band] = flux[band].reshape(1, len(flux[band]))
 
         ensembles[tracer] = Spectra(bands, wave, flux, ivar)
         ensembles[tracer].meta = dat[0].header
 
-    _tsnr_ensembles = ensembles
+    _tsnr_ensembles[cachekey] = ensembles
 
     duration = time.time() - t0
 
@@ -524,11 +566,6 @@ def fb_rdnoise(fibers, frame, tset):
         units as OBSRDNA, e.g. ang per pix.
     '''
 
-    ccdsizes = np.array(frame.meta['CCDSIZE'].split(',')).astype(float)
-
-    xtrans = ccdsizes[0] / 2.
-    ytrans = ccdsizes[1] / 2.
-
     #- default to a huge readnoise for traces off of amps
     rdnoise = np.zeros_like(frame.flux) + 1000
 
@@ -536,15 +573,18 @@ def fb_rdnoise(fibers, frame, tset):
     amp_sec     = { amp : desispec.preproc.parse_sec_keyword(frame.meta['CCDSEC'+amp]) for amp in amp_ids }
     amp_rdnoise = { amp : frame.meta['OBSRDN'+amp] for amp in amp_ids }
 
-    twave=np.linspace(tset.wavemin,tset.wavemax,20) # precision better than 0.3 pixel with 20 nodes
-    for ifiber in fibers:
-        x = tset.x_vs_wave(fiber=ifiber, wavelength=frame.wave)
-        y = tset.y_vs_wave(fiber=ifiber, wavelength=frame.wave)
-        for amp in amp_ids :
-            sec = amp_sec[amp]
-            ii=(x>=sec[1].start)&(x<sec[1].stop)&(y>=sec[0].start)&(y<sec[0].stop)
-            if np.sum(ii)>0 :
-                rdnoise[ifiber, ii] = amp_rdnoise[amp]
+    #- trace coordinates for all requested fibers at once, (nfiber x nwave)
+    fibers = np.atleast_1d(fibers)
+    x = np.atleast_2d(tset.x_vs_wave(fiber=fibers, wavelength=frame.wave))
+    y = np.atleast_2d(tset.y_vs_wave(fiber=fibers, wavelength=frame.wave))
+
+    fiber_rdnoise = rdnoise[fibers]
+    for amp in amp_ids :
+        sec = amp_sec[amp]
+        ii=(x>=sec[1].start)&(x<sec[1].stop)&(y>=sec[0].start)&(y<sec[0].stop)
+        fiber_rdnoise[ii] = amp_rdnoise[amp]
+
+    rdnoise[fibers] = fiber_rdnoise
 
     return rdnoise
 
@@ -637,12 +677,16 @@ def var_model(rdnoise_sigma, npix_1d, angperpix, angperspecbin, fiberflat, skymo
 
     # the extraction is performed with a wavelength bin of width = angperspecbin
     # so the effective number of CCD pixels corresponding to a spectral bin width is
-    npix_2d = npix_1d * (angperspecbin / angperpix)
+    # npix_2d = npix_1d * (angperspecbin / angperpix)
 
     # then, the extracted flux per specbin is converted to an extracted flux per A, so
-    # the variance has to be divided by the square of the conversion factor = angperspecbin**2
+    # the variance has to be divided by the square of the conversion factor = angperspecbin**2,
+    # i.e. rdnoise_sigma**2 * npix_2d / angperspecbin**2 = rdnoise_sigma**2 * npix_1d / (angperpix * angperspecbin)
+    # evaluated in place to avoid nfiber x nwave temporaries
 
-    rdnoise_variance = rdnoise_sigma**2 * npix_2d / angperspecbin**2
+    rdnoise_variance = np.square(rdnoise_sigma) * npix_1d
+    rdnoise_variance /= angperpix
+    rdnoise_variance /= angperspecbin
 
     # It was verified that this variance has to be increased by about 10% to match the
     # inverse variance reported in the frame files of a zero exposure (exptime=0).
@@ -650,11 +694,45 @@ def var_model(rdnoise_sigma, npix_1d, angperpix, angperspecbin, fiberflat, skymo
     # because the precomputed effective noise equivalent number of pixels (npix_1d)
     # is valid only when the Poisson noise is negligible. It increases with the spectral flux.
 
+    if alpha != 1.0:
+        rdnoise_variance *= alpha
+
+    sky_variance = np.abs(skymodel.flux)
+    sky_variance *= fiberflat.fiberflat
+
     if components:
-        return (alpha * rdnoise_variance, fiberflat.fiberflat * np.abs(skymodel.flux))
+        return (rdnoise_variance, sky_variance)
 
     else:
-        return alpha * rdnoise_variance + fiberflat.fiberflat * np.abs(skymodel.flux)
+        sky_variance += rdnoise_variance
+        return sky_variance
+
+@numba.jit(nopython=True, error_model='numpy', cache=True)
+def _tsnr2_sum(dflux, calib, fiberflat, transmission, fiberfrac, denom, maskfactor):
+    """
+    Accumulate the template SNR^2 of each fiber in a single pass
+
+    Args:
+        dflux: nfiber x nwave ensemble residual flux (may be a broadcast view)
+        calib: nfiber x nwave flux calibration
+        fiberflat: nfiber x nwave fiberflat
+        transmission: nfiber x nwave dust transmission (may be a broadcast view)
+        fiberfrac: nfiber array of fiber fractions (may be a broadcast view)
+        denom: nfiber x nwave model variance
+        maskfactor: nfiber x nwave weights, 0 for masked pixels
+
+    Returns nfiber array of sum((dflux*calib*fiberflat*transmission*fiberfrac)**2 / denom * maskfactor)
+    over wavelength, without allocating the nfiber x nwave intermediates.
+    """
+    nspec, nwave = calib.shape
+    tsnr2 = np.zeros(nspec)
+    for i in range(nspec):
+        total = 0.0
+        for j in range(nwave):
+            signal = dflux[i,j] * calib[i,j] * fiberflat[i,j] * transmission[i,j] * fiberfrac[i]
+            total += signal**2 / denom[i,j] * maskfactor[i,j]
+        tsnr2[i] = total
+    return tsnr2
 
 def gen_mask(frame, skymodel, hw=5.):
     """
@@ -738,18 +816,31 @@ def calc_alpha(frame, fibermap, rdnoise_sigma, npix_1d, angperpix, angperspecbin
     maskfactor = gen_mask(frame, skymodel)
     maskfactor = maskfactor[sky_indx,:]
 
-    def calc_alphavar(alpha):
-        return alpha * rd_var[sky_indx,:] + sky_var[sky_indx,:]
+    #- extract the unmasked sky pixels once; masked pixels do not contribute
+    good = maskfactor > 0
+    rd_var = rd_var[sky_indx,:][good]
+    sky_var = sky_var[sky_indx,:][good]
+    sky_ivar = frame.ivar[sky_indx,:][good]
+    weights = maskfactor[good]
 
     def alpha_X2(alpha):
-        _var = calc_alphavar(alpha)
-        _ivar =  1. / _var
-        X2 = np.abs(frame.ivar[sky_indx,:] - _ivar)
+        _ivar = 1. / (alpha * rd_var + sky_var)
+        X2 = np.abs(sky_ivar - _ivar)
 
-        return np.sum(X2 * maskfactor)
+        return np.dot(X2, weights)
 
-    res = minimize(alpha_X2, x0=[1.])
-    alpha = res.x[0]
+    #- 1D problem: Brent's method needs far fewer objective evaluations
+    #- than a multi-dimensional minimizer with numerical gradients
+    if not np.any(good):
+        log.warning('tSNR no unmasked sky pixels to fit alpha; using alpha = 1.0')
+        alpha = 1.0
+    else:
+        res = minimize_scalar(alpha_X2, bracket=(0.8, 1.2), method='brent', tol=1e-6)
+        if res.success and np.isfinite(res.x):
+            alpha = float(res.x)
+        else:
+            log.warning('tSNR alpha fit did not converge; using alpha = 1.0')
+            alpha = 1.0
 
     #- From JG PR #1164:
     # Noisy values of alpha can occur for observations dominated by sky noise
@@ -1081,7 +1172,8 @@ def calc_tsnr2(cframe, frame, fiberflat, skymodel, fluxcalib, alpha_only=False,
     # Evaluate.
     npix = nea(fibers, frame.wave)
     angperpix = angperpix(fibers, frame.wave)
-    angperspecbin = np.mean(np.gradient(frame.wave))
+    #- mean wavelength step; same as np.mean(np.gradient(wave)) on the uniform extraction grid
+    angperspecbin = (frame.wave[-1] - frame.wave[0]) / (len(frame.wave) - 1)
 
     for label, x in zip(['RDNOISE', 'NEA', 'ANGPERPIX', 'ANGPERSPECBIN'], [rdnoise, npix, angperpix, angperspecbin]):
         log.info('{} \t {:.3f} +- {:.3f}'.format(label.ljust(10), np.median(x), np.std(x)))
@@ -1104,6 +1196,13 @@ def calc_tsnr2(cframe, frame, fiberflat, skymodel, fluxcalib, alpha_only=False,
     maskfactor *= (cframe.ivar > 0.0)
     tsnrs = {}
 
+    #- the model variance and dust transmission do not depend upon the tracer,
+    #- so evaluate them once rather than per tracer
+    vmodel = var_model(rdnoise, npix, angperpix, angperspecbin, fiberflat, skymodel, alpha=alpha)
+    transmission = np.asarray(dust_transmission(frame.wave, ebv[:,None]))
+    no_transmission = np.broadcast_to(1.0, (nspec, nwave))
+    no_fiberfrac = np.broadcast_to(1.0, (nspec,))
+
     for tracer in ensemble.keys():
         wave = ensemble[tracer].wave[band]
         dflux = ensemble[tracer].flux[band]
@@ -1117,35 +1216,33 @@ def calc_tsnr2(cframe, frame, fiberflat, skymodel, fluxcalib, alpha_only=False,
             dflux = tmp
             wave = frame.wave
 
-        denom = var_model(rdnoise, npix, angperpix, angperspecbin, fiberflat, skymodel, alpha=alpha)
+        denom = vmodel
 
         if include_poisson:
             # TODO:  Fix default seeing-fiberfrac relation.
-            denom += var_tracer(tracer, frame, angperspecbin, fiberflat, fluxcalib)
+            poisson = var_tracer(tracer, frame, angperspecbin, fiberflat, fluxcalib)
+            if np.any(poisson != 0.0):
+                denom = vmodel + poisson
 
         # Work in uncalibrated flux units (electrons per angstrom); flux_calib includes exptime. tau.
-        # Broadcast.
-        dflux = dflux * fluxcalib.calib # [e/A]
-
         # Wavelength dependent fiber flat;  Multiply or divide - check with Julien.
-        result = dflux * fiberflat.fiberflat
-
         # Apply dust transmission.
         if tracer not in ['backup', 'gpbbackup']:
-            result *= dust_transmission(frame.wave, ebv[:,None])
+            tracer_transmission = transmission
+        else:
+            tracer_transmission = no_transmission
 
+        fiberfrac = no_fiberfrac
         if include_fiberfracs:
             if (tracer in tsnr_fiberfracs):
-                result *= tsnr_fiberfracs[tracer][:,None]
+                fiberfrac = np.asarray(tsnr_fiberfracs[tracer], dtype=float)
             else:
                 log.critical('Missing {} tracer in tsnr fiberfracs.'.format(tracer))
 
-        result = result**2.
-
-        result /= denom
-
         # Eqn. (1) of https://desi.lbl.gov/DocDB/cgi-bin/private/RetrieveFile?docid=4723;filename=sky-monitor-mc-study-v1.pdf;version=2
-        tsnrs[tracer] = np.sum(result * maskfactor, axis=1)
+        tsnrs[tracer] = _tsnr2_sum(np.broadcast_to(dflux, (nspec, nwave)),
+                                   fluxcalib.calib, fiberflat.fiberflat,
+                                   tracer_transmission, fiberfrac, denom, maskfactor)
 
     results=dict()
     for tracer in tsnrs.keys():
@@ -27,17 +27,18 @@ def get_good_fiberstatus(cat, isqso=False):
         good_fiberstatus: boolean array
     '''
 
+    fiberstatus = np.asarray(cat['COADD_FIBERSTATUS'])
     if not isqso:
-        good_fiberstatus = cat['COADD_FIBERSTATUS']==0
+        good_fiberstatus = fiberstatus==0
     else:
         # good_fiberstatus = (cat['COADD_FIBERSTATUS']==0) | (cat['COADD_FIBERSTATUS']==8388608) | (cat['COADD_FIBERSTATUS']==16777216)
         from desispec.maskbits import fibermask
-        good_fiberstatus = (cat['COADD_FIBERSTATUS']==0) | (cat['COADD_FIBERSTATUS']==fibermask['BADAMPR']) | (cat['COADD_FIBERSTATUS']==fibermask['BADAMPZ'])
-    good_fiberstatus &= cat['ZWARN'] & 2**9 == 0  # NO DATA flag
+        good_fiberstatus = (fiberstatus==0) | (fiberstatus==fibermask['BADAMPR']) | (fiberstatus==fibermask['BADAMPZ'])
+    good_fiberstatus &= np.asarray(cat['ZWARN']) & 2**9 == 0  # NO DATA flag
     return good_fiberstatus
 
 
-def validate(redrock_path, fiberstatus_cut=True, return_target_columns=False, extra_columns=None):
+def validate(redrock_path, fiberstatus_cut=True, return_target_columns=False, extra_columns=None, rows=None):
     '''
     Validate the redshift quality with tracer-dependent criteria for redrock+afterburner results.
 
@@ -48,6 +49,8 @@ def validate(redrock_path, fiberstatus_cut=True, return_target_columns=False, ex
         fiberstatus_cut: bool (default True), if True, impose requirements on COADD_FIBERSTATUS and ZWARN
         return_target_columns: bool (default False), if True, include columns that indicate if the object belongs to each class of DESI targets
         extra_columns: list of str (default None), additional columns to include in the output
+        rows: array of int (default None), only read and validate these rows of the
+            redrock file (and the matching rows of the afterburner files)
 
     Returns:
         cat: astropy table with basic columns such as TARGETID and boolean columns (e.g., GOOD_BGS)
@@ -60,7 +63,8 @@ def validate(redrock_path, fiberstatus_cut=True, return_target_columns=False, ex
 
     if extra_columns is None:
         extra_columns = ['TARGETID', 'Z', 'ZWARN', 'COADD_FIBERSTATUS']
-    output_columns = list(np.array(extra_columns)[~np.isin(extra_columns, output_columns)]) + output_columns
+    output_set = set(output_columns)
+    output_columns = [col for col in extra_columns if col not in output_set] + output_columns
 
     ############################ Load data ############################
 
@@ -75,49 +79,62 @@ def validate(redrock_path, fiberstatus_cut=True, return_target_columns=False, ex
     qso_qn_path = os.path.join(dir_path, os.path.basename(redrock_path).replace('redrock-', 'qso_qn-'))
     emline_path = os.path.join(dir_path, os.path.basename(redrock_path).replace('redrock-', 'emline-'))
 
-    tmp_redshifts = Table(fitsio.read(redrock_path, ext='REDSHIFTS', columns=columns_redshifts))
-    tid = tmp_redshifts['TARGETID'].copy()
+    tmp_redshifts = Table(fitsio.read(redrock_path, ext='REDSHIFTS', columns=columns_redshifts, rows=rows))
+    tid = np.asarray(tmp_redshifts['TARGETID'])
 
     # read the full fibermap until we determine the targeting columns
     from desitarget.targets import main_cmx_or_sv
-    tmp_fibermap = fitsio.read(redrock_path, ext='FIBERMAP')
+    tmp_fibermap = fitsio.read(redrock_path, ext='FIBERMAP', rows=rows)
     surv_target, surv_mask, surv = main_cmx_or_sv(tmp_fibermap)
     if surv.lower() == 'cmx':
         raise NotImplementedError('Determining valid redshifts for commissioning targets is not supported.')
 
     desi_target_col, bgs_target_col, _ = surv_target
     desi_mask, bgs_mask, _ = surv_mask
-    tmp_fibermap = Table(tmp_fibermap[columns_fibermap + surv_target])
-    assert np.all(tid==tmp_fibermap['TARGETID'])
-    tmp_fibermap.remove_column('TARGETID')
+    # accumulate TARGETID mismatches (non-zero XOR) of all files and check them once below;
+    # TARGETID is only kept from the redshifts table, so leave it out of the other tables.
+    # The XOR needs the same number of rows, so check that first for a clear error
+    def check_nrows(data, path, extname=None):
+        if len(data) != len(tid):
+            where = path if extname is None else f'{path} {extname}'
+            raise ValueError(f'{where} has {len(data)} rows but {redrock_path} REDSHIFTS has {len(tid)}')
+
+    check_nrows(tmp_fibermap, redrock_path, 'FIBERMAP')
+    tid_mismatch = tid ^ tmp_fibermap['TARGETID']
+    tmp_fibermap = Table(tmp_fibermap[columns_fibermap[1:] + surv_target])
 
     ignore_emline = False
     ignore_qso = False
 
     if os.path.isfile(emline_path):
-        tmp_emline = Table(fitsio.read(emline_path, columns=(columns_emline)))
-        assert np.all(tid==tmp_emline['TARGETID'])
-        tmp_emline.remove_column('TARGETID')
+        tmp_emline = fitsio.read(emline_path, columns=(columns_emline), rows=rows)
+        check_nrows(tmp_emline, emline_path)
+        tid_mismatch |= tid ^ tmp_emline['TARGETID']
+        tmp_emline = Table(tmp_emline[columns_emline[1:]])
     else:
         print('emline file not found:', emline_path)
         ignore_emline = True
 
     if os.path.isfile(qso_mgii_path):
-        tmp_qso_mgii = Table(fitsio.read(qso_mgii_path, columns=(columns_qso_mgii)))
-        assert np.all(tid==tmp_qso_mgii['TARGETID'])
-        tmp_qso_mgii.remove_column('TARGETID')
+        tmp_qso_mgii = fitsio.read(qso_mgii_path, columns=(columns_qso_mgii), rows=rows)
+        check_nrows(tmp_qso_mgii, qso_mgii_path)
+        tid_mismatch |= tid ^ tmp_qso_mgii['TARGETID']
+        tmp_qso_mgii = Table(tmp_qso_mgii[columns_qso_mgii[1:]])
     else:
         print('qso_mgii file not found:', qso_mgii_path)
         ignore_qso = True
 
     if os.path.isfile(qso_qn_path):
-        tmp_qso_qn = Table(fitsio.read(qso_qn_path, columns=(columns_qso_qn)))
-        assert np.all(tid==tmp_qso_qn['TARGETID'])
-        tmp_qso_qn.remove_column('TARGETID')
+        tmp_qso_qn = fitsio.read(qso_qn_path, columns=(columns_qso_qn), rows=rows)
+        check_nrows(tmp_qso_qn, qso_qn_path)
+        tid_mismatch |= tid ^ tmp_qso_qn['TARGETID']
+        tmp_qso_qn = Table(tmp_qso_qn[columns_qso_qn[1:]])
     else:
         print('qso_qn file not found:', qso_qn_path)
         ignore_qso = True
 
+    assert not np.any(tid_mismatch)
+
     cat = hstack([tmp_redshifts, tmp_fibermap], join_type='exact')
     if not ignore_emline:
         cat = hstack([cat, tmp_emline], join_type='exact')
@@ -125,12 +142,14 @@ def validate(redrock_path, fiberstatus_cut=True, return_target_columns=False, ex
         cat = hstack([cat, tmp_qso_mgii, tmp_qso_qn], join_type='exact')
 
     if return_target_columns:
+        desi_target = np.asarray(cat[desi_target_col])
+        bgs_target = np.asarray(cat[bgs_target_col])
         for name in ['LRG', 'ELG', 'QSO', 'ELG_LOP', 'ELG_HIP', 'ELG_VLO', 'BGS_ANY', 'BGS_FAINT', 'BGS_BRIGHT']:
             if name in ['BGS_FAINT', 'BGS_BRIGHT']:
-                cat[name] = cat[bgs_target_col] & bgs_mask[name] > 0
+                cat[name] = bgs_target & bgs_mask[name] > 0
             else:
                 if name in desi_mask.names(): # not all bits were used in SV (e.g., ELG_LOP)
-                    cat[name] = cat[desi_target_col] & desi_mask[name] > 0
+                    cat[name] = desi_target & desi_mask[name] > 0
                 else:
                     cat[name] = np.zeros(len(cat), bool)
         # # Bitmask definitions: https://github.com/desihub/desitarget/blob/master/py/desitarget/data/targetmask.yaml
@@ -174,46 +193,67 @@ def actually_validate(cat, fiberstatus_cut=True, ignore_emline=False, ignore_qso
 
     res = Table()
 
+    # work on plain ndarrays rather than going through astropy Column arithmetic
+    zwarn = np.asarray(cat['ZWARN'])
+    deltachi2 = np.asarray(cat['DELTACHI2'])
+
+    # the fiberstatus/ZWARN NO_DATA requirement is the same for BGS, LRG and ELG
+    if fiberstatus_cut:
+        good_fiberstatus = get_good_fiberstatus(cat)
+
     # BGS
-    res['GOOD_BGS'] = cat['ZWARN']==0
-    res['GOOD_BGS'] &= cat['DELTACHI2']>40
+    good_bgs = (zwarn==0) & (deltachi2>40)
     if fiberstatus_cut:
-        res['GOOD_BGS'] &= get_good_fiberstatus(cat)
+        good_bgs &= good_fiberstatus
+    res['GOOD_BGS'] = good_bgs
 
     # LRG
-    res['GOOD_LRG'] = cat['ZWARN']==0
-    res['GOOD_LRG'] &= cat['Z']<1.5
-    res['GOOD_LRG'] &= cat['DELTACHI2']>15
+    good_lrg = (zwarn==0) & (np.asarray(cat['Z'])<1.5) & (deltachi2>15)
     if fiberstatus_cut:
-        res['GOOD_LRG'] &= get_good_fiberstatus(cat)
+        good_lrg &= good_fiberstatus
+    res['GOOD_LRG'] = good_lrg
 
     # ELG
     if not ignore_emline:
+        oii_flux = np.asarray(cat['OII_FLUX'])
+        oii_flux_ivar = np.asarray(cat['OII_FLUX_IVAR'])
         with warnings.catch_warnings():
             warnings.simplefilter('ignore')
-            res['GOOD_ELG'] = (cat['OII_FLUX']>0) & (cat['OII_FLUX_IVAR']>0)
-            res['GOOD_ELG'] &= np.log10(cat['OII_FLUX'] * np.sqrt(cat['OII_FLUX_IVAR'])) > 0.9 - 0.2 * np.log10(cat['DELTACHI2'])
+            good_elg = (oii_flux>0) & (oii_flux_ivar>0)
+            good_elg &= np.log10(oii_flux * np.sqrt(oii_flux_ivar)) > 0.9 - 0.2 * np.log10(deltachi2)
         if fiberstatus_cut:
-            res['GOOD_ELG'] &= get_good_fiberstatus(cat)
+            good_elg &= good_fiberstatus
+        res['GOOD_ELG'] = good_elg
 
     if not ignore_qso:
         # QSO - adopted from the code from Edmond
         # https://github.com/echaussidon/LSS/blob/8ca53f4c38cfa29722ee6958687e188cc894ed2b/py/LSS/qso_cat_utils.py#L282
-        res['IS_QSO_QN'] = np.max(np.array([cat[name] for name in ['C_LYA', 'C_CIV', 'C_CIII', 'C_MgII', 'C_Hbeta', 'C_Halpha']]), axis=0) > 0.95
-        res['IS_QSO_QN_NEW_RR'] = cat['IS_QSO_QN_NEW_RR'] & res['IS_QSO_QN']
-        res['QSO_MASKBITS'] = np.zeros(len(cat), dtype=int)
-        res['QSO_MASKBITS'][cat['SPECTYPE']=='QSO'] += 2**1
-        res['QSO_MASKBITS'][cat['IS_QSO_MGII']] += 2**2
-        res['QSO_MASKBITS'][res['IS_QSO_QN']] += 2**3
-        res['QSO_MASKBITS'][res['IS_QSO_QN_NEW_RR']] += 2**4
-        res['Z'] = cat['Z'].copy()
-        res['Z'][res['IS_QSO_QN_NEW_RR']] = cat['Z_NEW'][res['IS_QSO_QN_NEW_RR']].copy()
-        res['ZERR'] = cat['ZERR'].copy()
-        res['ZERR'][res['IS_QSO_QN_NEW_RR']] = cat['ZERR_NEW'][res['IS_QSO_QN_NEW_RR']].copy()
+        # running elementwise max rather than stacking the six columns into a (6, N) array
+        max_qn = np.array(cat['C_LYA'])
+        for name in ['C_CIV', 'C_CIII', 'C_MgII', 'C_Hbeta', 'C_Halpha']:
+            np.maximum(max_qn, cat[name], out=max_qn)
+        is_qso_qn = max_qn > 0.95
+        is_qso_qn_new_rr = np.asarray(cat['IS_QSO_QN_NEW_RR']) & is_qso_qn
+        res['IS_QSO_QN'] = is_qso_qn
+        res['IS_QSO_QN_NEW_RR'] = is_qso_qn_new_rr
+        # each criterion sets its own bit, so OR them together in one pass
+        qso_maskbits = np.asarray(cat['SPECTYPE']=='QSO').astype(int) << 1
+        qso_maskbits |= np.asarray(cat['IS_QSO_MGII']).astype(int) << 2
+        qso_maskbits |= is_qso_qn.astype(int) << 3
+        qso_maskbits |= is_qso_qn_new_rr.astype(int) << 4
+        # use the QN-rerun redrock redshifts where available; fancy indexing already copies
+        inew = np.flatnonzero(is_qso_qn_new_rr)
+        z = np.array(cat['Z'])
+        z[inew] = np.asarray(cat['Z_NEW'])[inew]
+        zerr = np.array(cat['ZERR'])
+        zerr[inew] = np.asarray(cat['ZERR_NEW'])[inew]
+        res['Z'] = z
+        res['ZERR'] = zerr
         # Correct bump at z~3.7
-        sel_pb_redshift = (((res['Z'] > 3.65) & (res['Z'] < 3.9)) | ((res['Z'] > 5.15) & (res['Z'] < 5.35))) & ((cat['C_LYA'] < 0.95) | (cat['C_CIV'] < 0.95))
-        res['QSO_MASKBITS'][sel_pb_redshift] = 0
-        res['GOOD_QSO'] = res['QSO_MASKBITS']>0
+        sel_pb_redshift = (((z > 3.65) & (z < 3.9)) | ((z > 5.15) & (z < 5.35))) & ((cat['C_LYA'] < 0.95) | (cat['C_CIV'] < 0.95))
+        qso_maskbits[sel_pb_redshift] = 0
+        res['QSO_MASKBITS'] = qso_maskbits
+        res['GOOD_QSO'] = qso_maskbits>0
         if fiberstatus_cut:
             res['GOOD_QSO'] &= get_good_fiberstatus(cat, isqso=True)
 
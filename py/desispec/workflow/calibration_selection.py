@@ -7,7 +7,7 @@ import numpy as np
 from astropy.table import Table, vstack
 from collections import Counter
 
-from desiutil.log import get_logger
+from desiutil.log import get_logger, DEBUG
 from desispec.io.util import decode_camword, parse_badamps, all_impacted_cameras, erow_to_goodcamword
 
 
@@ -186,36 +186,41 @@ def select_valid_calib_exposures(etable, allow_any_laststep=None):
 
     ## For each exposure, determine if the exptime and obstype are consistent
     ## with a calibration exposure. For arcs and flats also check PROGRAM
+    ## Loop over plain arrays of the needed columns rather than Table rows
+    ## astype(str) so that bytes columns compare equal to str literals
     good_exptimes, exptype = [], []
-    for erow in etable:
+    obstypes = np.asarray(etable['OBSTYPE']).astype(str)
+    exptimes = np.asarray(etable['EXPTIME'])
+    programs = np.asarray(etable['PROGRAM']).astype(str)
+    for obstype, exptime, program in zip(obstypes, exptimes, programs):
         ## Zero should have 0 exptime
-        if erow['OBSTYPE'] == 'zero' \
-                and matches_exptime(erow['EXPTIME'], 0.):
+        if obstype == 'zero' \
+                and matches_exptime(exptime, 0.):
             good_exptimes.append(True)
             exptype.append('zero')
         ## Any 300s dark is valid
-        elif erow['OBSTYPE'] == 'dark' \
-                and matches_exptime(erow['EXPTIME'], 300.):
+        elif obstype == 'dark' \
+                and matches_exptime(exptime, 300.):
             good_exptimes.append(True)
             exptype.append('dark')
         ## only 5s arcs labeled "short Arcs all" have correct lamps
         ## for correct duration
-        elif erow['OBSTYPE'] == 'arc' \
-                and matches_exptime(erow['EXPTIME'], 5.) \
-                and erow['PROGRAM'] == 'calib short arcs all':
+        elif obstype == 'arc' \
+                and matches_exptime(exptime, 5.) \
+                and program == 'calib short arcs all':
             good_exptimes.append(True)
             exptype.append('arc')
         ## Only 120s flats labeled 'DESI-CALIB-0*' are correct for flat fielding
-        elif erow['OBSTYPE'] == 'flat' \
-                and matches_exptime(erow['EXPTIME'], 120.) \
-                and 'desi-calib-0' in erow['PROGRAM']:
+        elif obstype == 'flat' \
+                and matches_exptime(exptime, 120.) \
+                and 'desi-calib-0' in program:
             good_exptimes.append(True)
             exptype.append('flat')
         ## CTE flats come in 1s, 3s, and 10s varieties
-        elif erow['OBSTYPE'] == 'flat' and 'cte' in erow['PROGRAM']:
-            if matches_exptime(erow['EXPTIME'],1.) \
-                    or matches_exptime(erow['EXPTIME'],3.) \
-                    or matches_exptime(erow['EXPTIME'],10.):
+        elif obstype == 'flat' and 'cte' in program:
+            if matches_exptime(exptime,1.) \
+                    or matches_exptime(exptime,3.) \
+                    or matches_exptime(exptime,10.):
                 good_exptimes.append(True)
                 exptype.append('cteflat')
             else:
@@ -355,34 +360,43 @@ def find_best_arc_flat_sets(exptable, ngoodarcthreshold=3, nflatlamps=4,
     ## PROGRAM='calib short arcs all' and nflatlamps
     ## independent sets of SEQNUMs leading up to SEQTOT for flats
     ## differentiated by PROGRAM="calib desi-calib-0? leds only"
+    ## The sequence logic runs on plain arrays of the needed columns and the
+    ## builders hold row indices; Table rows are only made for debug messages
+    ## and the output tables are built by indexing exptable
     log.info(f"Looping over {len(exptable)} rows")
-    for erow in exptable:
-        obstype, program = str(erow['OBSTYPE']).lower(), str(erow['PROGRAM']).lower()
-        seqnum, seqtot = int(erow['SEQNUM']), int(erow['SEQTOT'])
-        log.debug(format_row_message("Processing erow", erow))
+    obstypes = np.char.lower(np.asarray(exptable['OBSTYPE']).astype(str))
+    programs = np.char.lower(np.asarray(exptable['PROGRAM']).astype(str))
+    seqnums = np.asarray(exptable['SEQNUM'])
+    seqtots = np.asarray(exptable['SEQTOT'])
+    debug = log.isEnabledFor(DEBUG)
+    for i, (obstype, program, seqnum, seqtot) in enumerate(zip(obstypes, programs,
+                                                               seqnums, seqtots)):
+        seqnum, seqtot = int(seqnum), int(seqtot)
+        if debug:
+            log.debug(format_row_message("Processing erow", exptable[i]))
         if obstype == 'arc' and program == 'calib short arcs all':
             flats = {lamp:[] for lamp in range(nflatlamps)}
             if seqnum == 1:
                 ## if the first arc then we are at the start of a new sequence
                 ## remove anything saved and register this as the first arc
-                log.debug(format_row_message(f"Identified the start of a new arc sequence:",
-                                             erow, exptable.colnames))
-                arcs = [erow]
-            elif len(arcs) > 0 and seqnum == arcs[-1]['SEQNUM']+1:
+                if debug:
+                    log.debug(format_row_message(f"Identified the start of a new arc sequence:",
+                                                 exptable[i], exptable.colnames))
+                arcs = [i]
+            elif len(arcs) > 0 and seqnum == seqnums[arcs[-1]]+1:
                 ## if not the first arc, make sure this arc is compatible with
                 ## the last arc. If so, add it
-                log.debug(format_row_message(f"Identified additional arc in sequence:",
-                                             erow, exptable.colnames))
-                arcs.append(erow)
-                if seqnum == seqtot and is_complete_set(arcs):
+                if debug:
+                    log.debug(format_row_message(f"Identified additional arc in sequence:",
+                                                 exptable[i], exptable.colnames))
+                arcs.append(i)
+                if seqnum == seqtot and is_complete_set(exptable[arcs]):
                     ## if the last arc in the sequence and all exps in the
                     ## sequence are present, do more processing to verify
                     ## this is a good set
                     log.info(f"Identified a complete set of {seqtot} arcs")
 
-                    ## vstack separate list of rows to avoid astropy #16119 bug modifying inputs.
-                    ## This keeps arcs as a list of Rows instead of becoming a list of Tables
-                    arctable = vstack(list(arcs))
+                    arctable = exptable[arcs]
 
                     ## count the number of good exposures
                     arctable = arctable[arctable['LASTSTEP']=='all']
@@ -434,49 +448,52 @@ def find_best_arc_flat_sets(exptable, ngoodarcthreshold=3, nflatlamps=4,
             ## restart the builders
             if lampnum is None:
                 ## if obstype isn't arc or flat, ignore it and reset the builders
-                log.debug(format_row_message(f"PROGRAM wasn't correct:",
-                                             erow, exptable.colnames))
+                if debug:
+                    log.debug(format_row_message(f"PROGRAM wasn't correct:",
+                                                 exptable[i], exptable.colnames))
                 flats = {lamp:[] for lamp in range(nflatlamps)}
             elif seqnum != len(flats[lampnum])+1 \
-                    or ( len(flats[lampnum]) > 0 and seqnum != flats[lampnum][-1]['SEQNUM']+1 ):
+                    or ( len(flats[lampnum]) > 0 and seqnum != seqnums[flats[lampnum][-1]]+1 ):
                 ## If current seqnum isn't compatible with what is already
                 ## in the flat structure for that lamp number, then reset
                 ## the entire flat builder
-                log.debug(format_row_message(f"flat {seqnum=} but exposures "
-                                             + f"already present for "
-                                             + f"{lampnum=}: {flats[lampnum]}. "
-                                             + f"Resetting flat sequence",
-                                             erow, exptable.colnames))
+                if debug:
+                    log.debug(format_row_message(f"flat {seqnum=} but exposures "
+                                                 + f"already present for "
+                                                 + f"{lampnum=}: {exptable[flats[lampnum]]}. "
+                                                 + f"Resetting flat sequence",
+                                                 exptable[i], exptable.colnames))
                 flats = {lamp:[] for lamp in range(nflatlamps)}
                 ## If first in the sequence, start add it and keep searching
                 ## If in the middle of the sequence don't add it since it's
                 ## clearly not the start of a sequence
                 if seqnum == 1:
-                    log.debug(format_row_message(f"Identified the start of a "
-                                                 + f"new flat lamp sequence:",
-                                                 erow, exptable.colnames))
-                    flats[lampnum].append(erow)
+                    if debug:
+                        log.debug(format_row_message(f"Identified the start of a "
+                                                     + f"new flat lamp sequence:",
+                                                     exptable[i], exptable.colnames))
+                    flats[lampnum].append(i)
             else:
                 ## If not the first flat in a sequence then it should be the next
                 ## in the sequence and one exp id away from the last expoure.
-                flats[lampnum].append(erow)
+                flats[lampnum].append(i)
 
                 ## If all lamps have the appropriate number of exposures and
                 ## the seqnums matched, then save as a valid series of flats
                 is_complete = False
                 if seqnum == seqtot:
-                    is_complete = np.all([is_complete_set(explist) for explist
-                                          in flats.values()])
+                    is_complete = np.all([is_complete_set(exptable[explist])
+                                          for explist in flats.values()])
 
                 if is_complete:
                     log.info(format_row_message(f"Found a complete flat set",
-                                                erow, exptable.colnames))
+                                                exptable[i], exptable.colnames))
                     callist = []
                     ## for each lamp, find the number of good flats and
                     ## add the flats to the list of expoures
                     for calflatlist in flats.values():
                         callist.extend(calflatlist)
-                    flattable = vstack(callist)  # list wrapper in case astropy changes inputs
+                    flattable = exptable[callist]
                     del callist
 
                     ## make sure all flat are valid, otherwise don't save set
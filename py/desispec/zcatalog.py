@@ -85,62 +85,50 @@ def find_primary_spectra(table, sort_column = 'TSNR2_LRG'):
         Array of spec_primary (= TRUE for the best spectrum)
     """
 
-    ## Convert into an astropy table
-    table = Table(table)
-
     ## Main columns that are required:
     ## TARGETID, ZWARN, SORT_COLUMN that is given by the user (default=TSNR2_LRG)
+    ## Only these columns are extracted; the rest of the table is not copied
+    targetid = np.asarray(table['TARGETID'])
+    nrows = len(targetid)
 
-    tsel = table['TARGETID', 'ZWARN', sort_column]
-
-    ## Adding a row number column to sort the final table back to the same order as the input
-    row = Column(np.arange(1, len(table)+1), name = 'ROW_NUMBER')
-    tsel.add_column(row)
-
-    ## Add the SPECPRIMARY and NSPEC columns - initialized to 0
-    nspec = Column(np.array([0]*len(table)), name = 'NSPEC', dtype = '>i4')
-    spec_prim = Column(np.array([0]*len(table)), name = 'SPECPRIMARY', dtype = 'bool')
-    tsel.add_column(nspec)
-    tsel.add_column(spec_prim)
-
-    ## Create a ZWARN_NOT_ZERO column
+    ## Create a ZWARN_NOT_ZERO key
     ## This helps to sort in the order such that ZWARN=0 is on top.
     ## The rest are then arranged based on the 'SORT_COLUMN'
-    tsel['ZWARN_NOT_ZERO'] = (tsel['ZWARN'] != 0).astype(int)
+    zwarn_not_zero = (np.asarray(table['ZWARN']) != 0).astype(int)
 
     ## Create an inverse sort_column -- this is for sorting in the decreasing order of sort_column
     ## Higher values of sort_column are considered as better
-    tsel['INV_SORT_COLUMN'] = 1/(tsel[sort_column] + 1e-99*(tsel[sort_column] == 0.0))
+    sort_values = np.asarray(table[sort_column])
+    inv_sort_column = 1/(sort_values + 1e-99*(sort_values == 0.0))
     ## The extra term in the denominator is added to avoid cases where the sort_column is 0, leading
     ## to unreal values when taking its inverse.
 
-    ## Sort by TARGETID, ZWARN_NOT_ZERO, and inverse sort_column -- in this order
-    tsel.sort(['TARGETID', 'ZWARN_NOT_ZERO', 'INV_SORT_COLUMN'])
+    ## Sort indices by TARGETID, ZWARN_NOT_ZERO, and inverse sort_column -- in this order
+    ## (lexsort uses the last key as the primary key)
+    order = np.lexsort((inv_sort_column, zwarn_not_zero, targetid))
+    sorted_targetid = targetid[order]
 
-    ## Selecting the unique targets, along with their indices and number of occurrences
-    targets, indices, return_indices, num = np.unique(tsel['TARGETID'].data, return_index = True, \
-                                                      return_inverse = True, return_counts = True)
+    ## Since we sorted by TARGETID, ZWARN_NOT_ZERO and inverse sort_column,
+    ## the first occurence of each target is the PRIMARY (with ZWARN = 0 or with higher sort_column)
+    isfirst = np.ones(nrows, dtype=bool)
+    isfirst[1:] = sorted_targetid[1:] != sorted_targetid[:-1]
+    istart = np.flatnonzero(isfirst)
+    num = np.diff(np.append(istart, nrows))
 
-    ## Since we sorted the table by TARGETID, ZWARN_NOT_ZERO and inverse sort_column
-    ## The first occurence of each target is the PRIMARY (with ZWARN = 0 or with higher sort_column)
-    ## This logic sets SPECPRIMARY = 1 for every first occurence of each target in this sorted table
-    tsel['SPECPRIMARY'][indices] = 1
+    ## Set SPECPRIMARY = True for every first occurence of each target,
+    ## mapped back to the original row order
+    spec_primary = np.zeros(nrows, dtype=bool)
+    spec_primary[order[istart]] = True
 
-    # Set the NSPEC for every target
-    tsel['NSPEC'] = num[return_indices].astype('>i2')
+    # Set the NSPEC for every target, in the original row order
+    nspec = np.zeros(nrows, dtype='>i2')
+    nspec[order] = np.repeat(num, num)
 
     # Note: SPECPRIMARY for negative TARGETIDs (stuck positioners on sky locations) is a bit
     # meaningless, but tile-based perexp and pernight catalogs can have repeats of those
     # and they are treated like other targets so that there is strictly one SPECPRIMARY
     # entry per TARGETID
 
-    ## Sort by ROW_NUMBER to get the original order -
-    tsel.sort('ROW_NUMBER')
-
-    ## Final nspec and specprimary arrays -
-    nspec = tsel['NSPEC'].data
-    spec_primary = tsel['SPECPRIMARY'].data
-
     return (nspec, spec_primary)
 
 ####################################################################################################